@@ -0,0 +1,44 @@
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from array_dungeon import ArrayDungeon
+from game import Dungeon
+
+BACKENDS = {"objects": Dungeon, "arrays": ArrayDungeon}
+
+
+def measure(dungeon_type, size):
+    gc.collect()
+    start = time.perf_counter()
+    dungeon = dungeon_type(size=size)
+    elapsed = time.perf_counter() - start
+    del dungeon
+    gc.collect()
+
+    # Memory is measured in a second build so tracing doesn't skew the timing
+    tracemalloc.start()
+    dungeon = dungeon_type(size=size)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del dungeon
+    return elapsed, retained / (size * size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Room-object and array dungeon storage.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 317, 1000],
+                        help="dungeon widths (rooms = size * size)")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'rooms':>9} {'generate (s)':>13} {'bytes/room':>11}")
+    for size in args.sizes:
+        for name in args.backends:
+            elapsed, bytes_per_room = measure(BACKENDS[name], size)
+            print(f"{name:<8} {size * size:>9} {elapsed:>13.3f} {bytes_per_room:>11.1f}")
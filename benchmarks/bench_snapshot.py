@@ -0,0 +1,43 @@
+import argparse
+import functools
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from array_dungeon import ArrayDungeon
+from game import Dungeon, GameEngine
+from lazy_dungeon import LazyDungeon
+from snapshot import load_game, save_game
+
+BACKENDS = {"objects": Dungeon, "lazy": LazyDungeon, "arrays": ArrayDungeon}
+
+
+def measure(dungeon_type, size, path):
+    engine = GameEngine(output_func=None, dungeon_factory=functools.partial(dungeon_type, size=size), seed=0)
+    start = time.perf_counter()
+    save_game(engine, path)
+    saved = time.perf_counter()
+    load_game(path, output_func=None, use_mmap=False)
+    loaded = time.perf_counter()
+    load_game(path, output_func=None, use_mmap=True)
+    mapped = time.perf_counter()
+    return saved - start, loaded - saved, mapped - loaded, os.path.getsize(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time saving and restoring game snapshots.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 317, 1000],
+                        help="dungeon widths (rooms = size * size)")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=["arrays"])
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'rooms':>9} {'save (s)':>9} {'load (s)':>9} {'mmap (s)':>9} {'bytes':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.snap")
+        for size in args.sizes:
+            for name in args.backends:
+                save, load, mapped, nbytes = measure(BACKENDS[name], size, path)
+                print(f"{name:<8} {size * size:>9} {save:>9.3f} {load:>9.3f} {mapped:>9.3f} {nbytes:>10}")
@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from server import GameServer, LineClient
+
+EXPLORATION_COMMANDS = ["move north", "move east", "move south", "move west", "attack", "status"]
+
+
+def _serve(port_queue):
+    async def main():
+        game_server = await GameServer(port=0).start()
+        port_queue.put(game_server.port)
+        await game_server.serve_forever()
+
+    asyncio.run(main())
+
+
+def choose_command(prompt, rng):
+    # The client only sees prompts, so it answers each kind in a fixed way
+    if prompt.startswith("Choose an action"):
+        return "attack"
+    if prompt.startswith("Choose an upgrade"):
+        return "3"
+    if prompt.startswith("What would you like to do?"):
+        return "continue"
+    return rng.choice(EXPLORATION_COMMANDS)
+
+
+async def play(port, commands, latencies, seed):
+    rng = random.Random(seed)
+    client = await LineClient.connect(port=port)
+    _, prompt = await client.read_until_prompt()
+    for _ in range(commands):
+        if prompt is None:
+            break  # Defeated; the server closed the session
+        start = time.perf_counter()
+        await client.send(choose_command(prompt, rng))
+        _, prompt = await client.read_until_prompt()
+        latencies.append(time.perf_counter() - start)
+    await client.close()
+
+
+async def run_clients(port, sessions, commands):
+    latencies = []
+    await asyncio.gather(*(play(port, commands, latencies, seed) for seed in range(sessions)))
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the game server over loopback TCP.")
+    parser.add_argument("--sessions", type=int, default=500, help="concurrent client sessions")
+    parser.add_argument("--commands", type=int, default=100, help="commands sent per session")
+    args = parser.parse_args()
+
+    # The server gets its own process so its CPU time can be measured apart
+    # from the clients'
+    port_queue = multiprocessing.Queue()
+    server_process = multiprocessing.Process(target=_serve, args=(port_queue,))
+    server_process.start()
+    port = port_queue.get()
+
+    cpu_before = os.times()
+    start = time.perf_counter()
+    latencies = asyncio.run(run_clients(port, args.sessions, args.commands))
+    elapsed = time.perf_counter() - start
+
+    server_process.terminate()
+    server_process.join()
+    cpu_after = os.times()
+    server_cpu = ((cpu_after.children_user - cpu_before.children_user)
+                  + (cpu_after.children_system - cpu_before.children_system))
+
+    percentiles = statistics.quantiles(latencies, n=100)
+    cores_used = server_cpu / elapsed if elapsed > 0 else 0
+    print(f"Sessions: {args.sessions}, commands: {len(latencies)} in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} commands/s)")
+    print(f"Latency p50: {statistics.median(latencies) * 1000:.2f} ms, p99: {percentiles[98] * 1000:.2f} ms")
+    if cores_used > 0:
+        print(f"Server CPU: {server_cpu:.2f}s ({cores_used:.2f} cores), "
+              f"{args.sessions / cores_used:.0f} sessions per core")
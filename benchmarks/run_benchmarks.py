@@ -0,0 +1,254 @@
+import argparse
+import datetime
+import functools
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from array_dungeon import ArrayDungeon
+from autoplay import ExpectimaxPolicy
+from game import Dungeon, Enemy, EnemyTemplate, GameEngine, GameState
+from generators import GENERATORS
+from simulation import GreedyPolicy
+
+# Every result is {"benchmark", "params", "metrics"}. Metrics named here get
+# worse as they grow; all the others are rates, where higher is better.
+LOWER_IS_BETTER = {"seconds", "peak_bytes", "bytes_per_room", "p99_seconds"}
+DEFAULT_SIZES = [5, 10, 25, 50, 100, 250, 500, 1000, 2000]
+# Exploration commands that leave the game state as it was, so they can be
+# dispatched over and over
+DISPATCH_COMMANDS = ["status", "inventory", "help", "take nothing", "move nowhere", "dance"]
+
+
+def result(benchmark, params, **metrics):
+    return {"benchmark": benchmark, "params": params, "metrics": metrics}
+
+
+def best_of(func, repeat):
+    # Fastest of `repeat` timed calls, to keep scheduler noise out
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def quiet_engine(seed=0, input_func=None):
+    return GameEngine(input_func=input_func, output_func=None, terse=True, seed=seed, prefetch_stages=False)
+
+
+def bench_construction(sizes):
+    for size in sizes:
+        rooms = size * size
+        seconds = best_of(lambda: Dungeon(size=size, seed=0), repeat=5 if rooms <= 10000 else 1)
+        # Memory comes from a separate build so tracing doesn't skew the timing
+        gc.collect()
+        tracemalloc.start()
+        dungeon = Dungeon(size=size, seed=0)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del dungeon
+        yield result("dungeon_construction", {"size": size}, seconds=seconds, peak_bytes=peak,
+                     bytes_per_room=peak / rooms)
+
+
+def bench_description(size=20, rounds=50):
+    rooms = list(Dungeon(size=size, seed=0).rooms.values())
+    calls = rounds * len(rooms)
+
+    def render():
+        for _ in range(rounds):
+            for room in rooms:
+                room.invalidate_description()
+                room.get_description()
+
+    def cached():
+        for _ in range(rounds):
+            for room in rooms:
+                room.get_description()
+
+    yield result("get_description", {"size": size, "cache": "cold"},
+                 calls_per_second=calls / best_of(render, repeat=3))
+    yield result("get_description", {"size": size, "cache": "warm"},
+                 calls_per_second=calls / best_of(cached, repeat=3))
+
+
+def bench_dispatch(rounds=20000):
+    engine = quiet_engine()
+    parse = engine._parse_exploration_command
+
+    def dispatch():
+        for _ in range(rounds):
+            for command in DISPATCH_COMMANDS:
+                parse(command)
+            engine.output.clear()
+
+    calls = rounds * len(DISPATCH_COMMANDS)
+    yield result("parse_exploration_command", {"commands": DISPATCH_COMMANDS},
+                 calls_per_second=calls / best_of(dispatch, repeat=3))
+
+
+def bench_exploration(seeds=10, turns=5000):
+    # Greedy headless play, timing only the turns that start in exploration
+    # (room description, stage-clear check, encounter roll, command)
+    elapsed = 0.0
+    count = 0
+    for seed in range(seeds):
+        policy = GreedyPolicy(seed)
+        engine = quiet_engine(seed)
+        engine.input = lambda prompt: policy.choose(engine, prompt)
+        for _ in range(turns):
+            if engine.game_state == GameState.GAME_OVER:
+                break
+            exploring = engine.game_state == GameState.EXPLORATION
+            start = time.perf_counter()
+            engine.step()
+            if exploring:
+                elapsed += time.perf_counter() - start
+                count += 1
+    yield result("exploration_turns", {"seeds": seeds, "turns": turns}, turns_per_second=count / elapsed)
+
+
+def bench_battle(turns=50000):
+    # One endless fight: a dummy that can't be killed in time against a
+    # player who can't die
+    engine = quiet_engine(input_func=lambda prompt: "attack")
+    engine.player.max_hp = engine.player.hp = 10 ** 12
+    engine.current_enemy = Enemy(EnemyTemplate("Dummy", 10 ** 12, 1, 0, 0, 0))
+    engine.game_state = GameState.BATTLE
+
+    def fight():
+        for _ in range(turns):
+            engine.step()
+
+    yield result("battle_turns", {"turns": turns}, turns_per_second=turns / best_of(fight, repeat=3))
+
+
+def bench_autoplay(seeds=3, turns=2000):
+    # Time the expectimax agent's decisions alone, over headless games
+    timings = []
+    for seed in range(seeds):
+        policy = ExpectimaxPolicy()
+        engine = quiet_engine(seed)
+
+        def decide(prompt):
+            start = time.perf_counter()
+            command = policy.choose(engine, prompt)
+            timings.append(time.perf_counter() - start)
+            return command
+
+        engine.input = decide
+        for _ in range(turns):
+            if engine.game_state == GameState.GAME_OVER:
+                break
+            engine.step()
+    timings.sort()
+    yield result("autoplay_decisions", {"seeds": seeds, "turns": turns},
+                 decisions_per_second=len(timings) / sum(timings),
+                 p99_seconds=timings[int(len(timings) * 0.99)])
+
+
+def bench_stage_handoff(size=200):
+    # How long "continue" keeps the player waiting, building the next stage
+    # then or taking the one prefetched while they were in the hub
+    for prefetch in (False, True):
+        engine = GameEngine(input_func=None, output_func=None, terse=True, seed=0, prefetch_stages=prefetch,
+                            dungeon_factory=functools.partial(Dungeon, size=size))
+        engine.game_state = GameState.HUB
+        turn = engine.turn()
+        next(turn)
+        while prefetch and not engine.next_stage_prefetch.ready:
+            time.sleep(0.01)  # The player reading the hub menu
+        start = time.perf_counter()
+        try:
+            turn.send("continue")
+        except StopIteration:
+            pass
+        yield result("stage_handoff", {"size": size, "prefetch": prefetch}, seconds=time.perf_counter() - start)
+
+
+def bench_generation(size=1000):
+    # Whole-stage generation for every layout, on the array backend where
+    # the carving and the placement are all NumPy
+    for generator in GENERATORS:
+        seconds = best_of(lambda: ArrayDungeon(size=size, seed=0, generator=generator), repeat=3)
+        yield result("stage_generation", {"size": size, "generator": generator}, seconds=seconds)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, threshold):
+    # Results more than `threshold` (a fraction) worse than the baseline
+    previous = {(entry["benchmark"], json.dumps(entry["params"], sort_keys=True)): entry["metrics"]
+                for entry in baseline["results"]}
+    regressions = []
+    for entry in results:
+        old = previous.get((entry["benchmark"], json.dumps(entry["params"], sort_keys=True)))
+        if old is None:
+            continue
+        for metric, value in entry["metrics"].items():
+            before = old.get(metric)
+            if not before:
+                continue
+            change = (value - before) / before
+            if metric not in LOWER_IS_BETTER:
+                change = -change
+            if change > threshold:
+                regressions.append((entry["benchmark"], entry["params"], metric, before, value))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and write the results as JSON.")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="dungeon widths for the construction benchmark")
+    parser.add_argument("--max-size", type=int, default=None, help="skip construction sizes above this")
+    parser.add_argument("--compare", default=None, help="baseline JSON file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    sizes = [size for size in args.sizes if args.max_size is None or size <= args.max_size]
+    suites = [bench_construction(sizes), bench_description(), bench_dispatch(), bench_exploration(),
+              bench_battle(), bench_autoplay(), bench_stage_handoff(), bench_generation()]
+    results = []
+    for suite in suites:
+        for entry in suite:
+            results.append(entry)
+            metrics = ", ".join(f"{name}={value:.6g}" for name, value in entry["metrics"].items())
+            print(f"{entry['benchmark']} {json.dumps(entry['params'])}: {metrics}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for benchmark, params, metric, before, after in regressions:
+            print(f"REGRESSION {benchmark} {json.dumps(params)} {metric}: {before:.6g} -> {after:.6g}")
+        sys.exit(1 if regressions else 0)
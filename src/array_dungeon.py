@@ -0,0 +1,339 @@
+import random
+from collections.abc import Mapping
+
+import numpy as np
+
+from game import BOSS_ENEMY, DUNGEON_ITEMS, ENEMY_REGISTRY, WANDERING_ENEMIES, Dungeon, Enemy, Room, room_description
+from generators import DIRECTION_BITS, generate_exits, place_contents
+from inventory import Inventory
+from lazy_dungeon import LazyRooms
+
+DIRECTION_OFFSETS = {"north": (0, 1), "east": (1, 0), "south": (0, -1), "west": (-1, 0)}
+# Same exit order as the eager grid, so descriptions read identically
+EXIT_ORDER = ("west", "south", "north", "east")
+
+ENEMY_KINDS = WANDERING_ENEMIES + [BOSS_ENEMY]  # enemy_kind column values; -1 means no enemy
+ITEM_NAMES = [None] + DUNGEON_ITEMS  # item column values; 0 means no item
+ITEM_KEYS = [None] + [name.casefold() for name in DUNGEON_ITEMS]
+
+
+class MaskExits(Mapping):
+    # Room.exits read straight from a cell's exit bitmask
+    def __init__(self, dungeon, coords):
+        self.dungeon = dungeon
+        self.coords = coords
+        self.mask = int(dungeon.exits[dungeon._index(coords)])
+
+    def __getitem__(self, direction):
+        if not self.mask & DIRECTION_BITS.get(direction, 0):
+            raise KeyError(direction)
+        dx, dy = DIRECTION_OFFSETS[direction]
+        return self.dungeon.get_room((self.coords[0] + dx, self.coords[1] + dy))
+
+    def __iter__(self):
+        return (direction for direction in EXIT_ORDER if self.mask & DIRECTION_BITS[direction])
+
+    def __len__(self):
+        return bin(self.mask).count("1")
+
+
+class ArrayEnemy(Enemy):
+    # View of the enemy stored in one cell: its kind picks the dungeon's
+    # shared template, and damage written through `hp` lands directly in
+    # the dungeon's enemy_hp array.
+    __slots__ = ("dungeon", "index")
+
+    def __init__(self, dungeon, index):
+        self.dungeon = dungeon
+        self.index = index
+
+    @property
+    def template(self):
+        return self.dungeon.enemy_templates[self.dungeon.enemy_kind[self.index]]
+
+    @property
+    def hp(self):
+        return int(self.dungeon.enemy_hp[self.index])
+
+    @hp.setter
+    def hp(self, value):
+        self.dungeon.enemy_hp[self.index] = value
+
+    def __eq__(self, other):
+        return (isinstance(other, ArrayEnemy) and other.dungeon is self.dungeon
+                and other.index == self.index)
+
+    def __hash__(self):
+        return hash((id(self.dungeon), self.index))
+
+
+class ArrayRoom(Room):
+    # Thin view over one cell of an ArrayDungeon. Enemies and items added
+    # after generation don't fit the one-per-cell columns, so they are kept
+    # as ordinary objects in the dungeon's overflow dicts.
+    __slots__ = ("index",)
+
+    def __init__(self, dungeon, coords):
+        self._description_cache = None
+        self.dungeon = dungeon
+        self.coords = coords
+        self.index = dungeon._index(coords)
+
+    @property
+    def description(self):
+        return self.dungeon._description(self.coords)
+
+    @property
+    def exits(self):
+        return MaskExits(self.dungeon, self.coords)
+
+    @property
+    def enemies(self):
+        enemies = [ArrayEnemy(self.dungeon, self.index)] if self.dungeon.enemy_kind[self.index] >= 0 else []
+        return enemies + self.dungeon.extra_enemies.get(self.index, [])
+
+    @property
+    def items(self):
+        # A fresh Inventory of the column's item followed by the extras;
+        # change the room through add_item/remove_item
+        code = self.dungeon.items[self.index]
+        extras = self.dungeon.extra_items.get(self.index)
+        if not code:
+            return extras.copy() if extras else Inventory()
+        items = Inventory([ITEM_NAMES[code]])
+        if extras:
+            items.update(extras)
+        return items
+
+    @property
+    def visited(self):
+        return bool(self.dungeon.visited[self.index])
+
+    @visited.setter
+    def visited(self, value):
+        self.dungeon.visited[self.index] = value
+
+    def add_exit(self, direction, room):
+        dx, dy = DIRECTION_OFFSETS[direction]
+        if room.coords != (self.coords[0] + dx, self.coords[1] + dy):
+            raise ValueError("array dungeons only connect neighbouring cells")
+        self.dungeon._own_exits()
+        self.dungeon.exits[self.index] |= DIRECTION_BITS[direction]
+        self._description_cache = None
+
+    def add_enemy(self, enemy):
+        self.dungeon.extra_enemies.setdefault(self.index, []).append(enemy)
+        self._description_cache = None
+        self.dungeon._enemy_added(self)
+        self.dungeon._enemies_changed(self)
+
+    def remove_enemy(self, enemy):
+        dungeon = self.dungeon
+        extras = dungeon.extra_enemies.get(self.index, [])
+        if dungeon.enemy_kind[self.index] >= 0 and enemy == ArrayEnemy(dungeon, self.index):
+            dungeon.enemy_kind[self.index] = -1
+        elif enemy in extras:
+            extras.remove(enemy)
+        else:
+            return False
+        self._description_cache = None
+        dungeon._enemy_removed(self)
+        dungeon._enemies_changed(self)
+        return True
+
+    def add_item(self, item):
+        extras = self.dungeon.extra_items.get(self.index)
+        if extras is None:
+            extras = self.dungeon.extra_items[self.index] = Inventory()
+        extras.add(item)
+        self._description_cache = None
+
+    def remove_item(self, item_name_to_remove):
+        code = self.dungeon.items[self.index]
+        if code and ITEM_KEYS[code] == item_name_to_remove.casefold():
+            self.dungeon.items[self.index] = 0
+            self._description_cache = None
+            return True
+        extras = self.dungeon.extra_items.get(self.index)
+        if extras is None or extras.remove(item_name_to_remove) is None:
+            return False
+        self._description_cache = None
+        return True
+
+
+class ArrayDungeon(Dungeon):
+    # Struct-of-arrays storage: one entry per cell (index x * size + y) in
+    # flat NumPy columns instead of one Room object per cell. get_room hands
+    # out ArrayRoom views, so the engine sees the usual Room interface.
+    # Enemy stats aren't stored per cell: every enemy of a kind shares the
+    # registry's template for this stage, so only kind and HP are columns.
+    # Passing `columns` (a dict with the arrays named in COLUMNS plus
+    # "enemy_templates", optionally "extra_enemies"/"extra_items") wraps
+    # existing storage, e.g. a memory-mapped snapshot, instead of generating.
+    # Passing `layouts` (shared_layout.SharedLayouts) reads the exit graph
+    # and base descriptions from a layout shared between processes, so only
+    # the per-session columns are this dungeon's own; layouts are only
+    # shared for the full grid.
+    COLUMNS = ("visited", "exits", "enemy_kind", "items", "enemy_hp")
+
+    def __init__(self, size=5, stage_level=1, is_boss_stage=False, seed=None, rng=None, columns=None,
+                 layouts=None, generator="grid"):
+        if seed is None:
+            # Placement uses a NumPy generator, so draw an integer seed from `rng`
+            seed = (rng or random).getrandbits(64)
+        self._preset_columns = columns
+        self.layout = layouts.get(size) if layouts is not None and generator == "grid" else None
+        super().__init__(size, stage_level, is_boss_stage, seed=seed, generator=generator)
+
+    def _index(self, coords):
+        return coords[0] * self.size + coords[1]
+
+    def _in_bounds(self, coords):
+        x, y = coords
+        return 0 <= x < self.size and 0 <= y < self.size
+
+    def _init_enemy_index(self):
+        self.enemy_count = 0
+        self._enemy_room_count = 0
+
+    def _generate_dungeon(self):
+        self.rooms = LazyRooms(self)
+        if self._preset_columns is not None:
+            self._adopt_columns(self._preset_columns)
+            self._preset_columns = None
+            return
+
+        size = self.size
+        cells = size * size
+        self.extra_enemies = {}  # {index: [Enemy, ...]} added after generation
+        self.extra_items = {}  # {index: Inventory} added after generation
+        self.visited = np.zeros(cells, dtype=bool)
+
+        rng = np.random.default_rng(self.seed)
+        floor = None
+        if self.layout is not None:
+            self.exits = self.layout.exits  # Read-only; see _own_exits
+        else:
+            self.exits = generate_exits(self.generator, size, rng)
+            if self.generator != "grid":
+                floor = self.exits != 0
+
+        start = self._index(self.start_room_coords)
+        if self.is_boss_stage:
+            self.enemy_kind = np.full(cells, -1, dtype=np.int8)
+            self.items = np.zeros(cells, dtype=np.uint8)
+            self.enemy_kind[self._index(self.exit_coords)] = ENEMY_KINDS.index(BOSS_ENEMY)
+        else:
+            self.enemy_kind, self.items = place_contents(rng, cells, start, self.stage_level,
+                                                         len(WANDERING_ENEMIES), len(ITEM_NAMES) - 1, floor)
+
+        self.enemy_templates = [ENEMY_REGISTRY.template(name, self.stage_level, is_boss=name == BOSS_ENEMY)
+                                for name in ENEMY_KINDS]
+        max_hp = np.array([template.max_hp for template in self.enemy_templates], dtype=np.int32)
+        self.enemy_hp = max_hp[np.maximum(self.enemy_kind, 0)]
+        self._count_enemies()
+
+    def _adopt_columns(self, columns):
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+        self.enemy_templates = list(columns["enemy_templates"])
+        self.extra_enemies = columns.get("extra_enemies", {})
+        self.extra_items = columns.get("extra_items", {})
+        self._count_enemies()
+
+    def _count_enemies(self):
+        occupied = self.enemy_kind >= 0
+        column_enemies = int(np.count_nonzero(occupied))
+        self.enemy_count = column_enemies + sum(len(extras) for extras in self.extra_enemies.values())
+        self._enemy_room_count = column_enemies + sum(1 for index, extras in self.extra_enemies.items()
+                                                      if extras and not occupied[index])
+
+    def _own_exits(self):
+        # Copy a shared exit graph before changing it
+        if not self.exits.flags.writeable:
+            self.exits = self.exits.copy()
+
+    def _description(self, coords):
+        if self.layout is not None:
+            return self.layout.description(self._index(coords)) + self._description_suffix(coords)
+        return room_description(coords) + self._description_suffix(coords)
+
+    def base_descriptions(self):
+        # Every cell's description before the stage adds its portal text, in
+        # cell order
+        size = self.size
+        return [room_description((x, y)) for x in range(size) for y in range(size)]
+
+    def exit_bitmasks(self):
+        return self.exits
+
+    def mark_visited(self, room):
+        room.visited = True  # Already a column
+
+    def get_room(self, coords):
+        if not self._in_bounds(coords):
+            return None
+        return ArrayRoom(self, coords)
+
+    def _enemy_added(self, room):
+        self.enemy_count += 1
+        if len(room.enemies) == 1:
+            self._enemy_room_count += 1
+
+    def _enemy_removed(self, room):
+        self.enemy_count -= 1
+        if not room.enemies:
+            self._enemy_room_count -= 1
+
+    def rooms_with_enemies_remaining(self):
+        return self._enemy_room_count
+
+    def enemy_coords(self):
+        occupied = set(np.flatnonzero(self.enemy_kind >= 0).tolist())
+        occupied.update(index for index, extras in self.extra_enemies.items() if extras)
+        return [divmod(index, self.size) for index in occupied]
+
+    def neighbours(self, coords):
+        # Straight from the exit bitmask, without building room views
+        mask = int(self.exits[self._index(coords)])
+        x, y = coords
+        neighbours = []
+        for direction in EXIT_ORDER:
+            if mask & DIRECTION_BITS[direction]:
+                dx, dy = DIRECTION_OFFSETS[direction]
+                neighbours.append((direction, (x + dx, y + dy)))
+        return neighbours
+
+    def breadth_first(self, cells):
+        # Level-by-level search outward from `cells` over the exit bitmasks.
+        # Returns (steps to the nearest of them, which one it is) per cell,
+        # -1 where none can be reached; navigation.DistanceField uses this
+        # for its initial build.
+        distance = np.full(self.size * self.size, -1, dtype=np.int32)
+        owner = np.full(self.size * self.size, -1, dtype=np.int32)
+        frontier = np.asarray(cells, dtype=np.int64)
+        distance[frontier] = 0
+        owner[frontier] = frontier
+        steps = 0
+        while frontier.size:
+            steps += 1
+            masks = self.exits[frontier]
+            reached = []
+            for direction, bit in DIRECTION_BITS.items():
+                dx, dy = DIRECTION_OFFSETS[direction]
+                sources = frontier[(masks & bit) != 0]
+                targets = sources + dx * self.size + dy
+                new = distance[targets] == -1
+                sources, targets = sources[new], targets[new]
+                distance[targets] = steps
+                owner[targets] = owner[sources]
+                reached.append(targets)
+            # Cells claimed by an earlier direction fail the `new` test of the
+            # later ones, so the next frontier has no duplicates
+            frontier = np.concatenate(reached)
+        return distance, owner
+
+    def nbytes(self):
+        # Memory of this dungeon's own columns, not counting a shared layout
+        return sum(getattr(self, name).nbytes for name in self.COLUMNS
+                   if self.layout is None or getattr(self, name) is not self.layout.exits)
@@ -0,0 +1,240 @@
+from collections import OrderedDict, namedtuple
+
+from game import BOSS_ENEMY, ENEMY_REGISTRY, WANDERING_ENEMIES, GameState
+from navigation import UNREACHABLE, NavigationIndex
+
+# The chance rolls of GameEngine the search plays against
+FLEE_CHANCE = 0.5  # _battle_flee
+ENCOUNTER_CHANCE = 0.2  # _exploration_state, on entering a room without enemies
+# Hub upgrades as _upgrade_attack/_upgrade_max_hp apply them:
+# choice -> (attack gained, max HP gained, gold cost, XP cost)
+UPGRADES = {"1": (5, 0, 20, 50), "2": (0, 20, 15, 40)}
+
+# How outcomes are scored. A leaf is worth the player's HP plus whatever the
+# fight earned; dying outweighs everything.
+DEATH_VALUE = -10000.0
+XP_VALUE = 0.5
+GOLD_VALUE = 0.2
+LEVEL_VALUE = 30.0  # +2 attack and +1 defense, on top of the full heal
+KILL_VALUE = 25.0  # A room enemy out of the way of clearing the stage
+STEP_VALUE = 100.0  # Per step further from the next target; outweighs all but deadly encounters
+SEARCH_DEPTH = 8  # Battle plies searched before the closed-form rollout
+
+# The parts of a fight that stay fixed from turn to turn. Together with the
+# two HP totals they make up a battle state.
+Matchup = namedtuple("Matchup", ["player_damage", "enemy_damage", "max_hp", "xp_needed", "xp_drop",
+                                 "gold_drop", "room_enemy"])
+
+
+def matchup(player, enemy, room_enemy=False):
+    return Matchup(max(0, player.attack - enemy.defense), max(0, enemy.attack - player.defense),
+                   player.max_hp, player.level * 100 - player.xp, enemy.xp_drop, enemy.gold_drop,
+                   room_enemy)
+
+
+class TranspositionTable:
+    # Bounded map of searched battle states, dropping the least recently
+    # used entry once full
+    def __init__(self, max_entries=200000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # {(Matchup, player hp, enemy hp): (depth, value, action)}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, depth):
+        # The stored result, if it was searched at least `depth` plies deep
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, depth, value, action):
+        self.entries[key] = (depth, value, action)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class BattleSearch:
+    # Expectimax over _battle_state: the player picks attack or flee (magic
+    # and items only waste the turn), a flee succeeds half the time, and the
+    # enemy strikes back whenever the battle goes on. Past SEARCH_DEPTH the
+    # better of "attack until it ends" and "flee until it works" is taken.
+    def __init__(self, table=None, depth=SEARCH_DEPTH):
+        self.table = table if table is not None else TranspositionTable()
+        self.depth = depth
+
+    def best(self, fight, player_hp, enemy_hp):
+        # (action, expected value) for the player to move
+        value, action = self._search(fight, player_hp, enemy_hp, self.depth)
+        return action, value
+
+    def value(self, fight, player_hp, enemy_hp):
+        return self._search(fight, player_hp, enemy_hp, self.depth)[0]
+
+    def _search(self, fight, player_hp, enemy_hp, depth):
+        key = (fight, player_hp, enemy_hp)
+        entry = self.table.get(key, depth)
+        if entry is not None:
+            return entry[1], entry[2]
+
+        player_damage, enemy_damage = fight.player_damage, fight.enemy_damage
+        if enemy_damage == 0:
+            # Nothing can go wrong: win if possible, otherwise flee eventually
+            if player_damage > 0:
+                value, action = self._won(fight, player_hp), "attack"
+            else:
+                value, action = self._escaped(fight, player_hp), "flee"
+        elif depth == 0:
+            attack, flee = self._attack_line(fight, player_hp, enemy_hp), self._flee_line(fight, player_hp)
+            value, action = (attack, "attack") if attack >= flee else (flee, "flee")
+        else:
+            if enemy_hp <= player_damage:
+                attack = self._won(fight, player_hp)
+            elif player_hp <= enemy_damage:
+                attack = DEATH_VALUE
+            elif player_damage == 0:
+                attack = DEATH_VALUE  # Worse than fleeing whatever it leads to
+            else:
+                attack = self._search(fight, player_hp - enemy_damage, enemy_hp - player_damage, depth - 1)[0]
+
+            if player_hp <= enemy_damage:
+                caught = DEATH_VALUE
+            else:
+                caught = self._search(fight, player_hp - enemy_damage, enemy_hp, depth - 1)[0]
+            flee = FLEE_CHANCE * self._escaped(fight, player_hp) + (1 - FLEE_CHANCE) * caught
+            value, action = (attack, "attack") if attack >= flee else (flee, "flee")
+
+        self.table.put(key, depth, value, action)
+        return value, action
+
+    def _won(self, fight, player_hp):
+        value = XP_VALUE * fight.xp_drop + GOLD_VALUE * fight.gold_drop
+        if fight.room_enemy:
+            value += KILL_VALUE
+        if fight.xp_drop >= fight.xp_needed:
+            # Player.level_up: +10 max HP and a full heal
+            return value + fight.max_hp + 10 + LEVEL_VALUE
+        return value + player_hp
+
+    def _escaped(self, fight, player_hp):
+        return float(player_hp)
+
+    def _attack_line(self, fight, player_hp, enemy_hp):
+        if fight.player_damage == 0:
+            return DEATH_VALUE
+        hits = -(-enemy_hp // fight.player_damage)
+        player_hp -= (hits - 1) * fight.enemy_damage
+        return self._won(fight, player_hp) if player_hp > 0 else DEATH_VALUE
+
+    def _flee_line(self, fight, player_hp):
+        # Flee every turn: escape at the k-th try with chance FLEE_CHANCE *
+        # (1 - FLEE_CHANCE)^k, having been hit k times
+        value = 0.0
+        reach = 1.0  # Chance of still being in the fight
+        while player_hp > 0 and reach > 1e-9:
+            value += reach * FLEE_CHANCE * self._escaped(fight, player_hp)
+            reach *= 1 - FLEE_CHANCE
+            player_hp -= fight.enemy_damage
+        return value + reach * DEATH_VALUE
+
+
+class ExpectimaxPolicy:
+    # Autoplay agent: battles are searched move by move with BattleSearch;
+    # rooms are picked one step ahead, weighing each door's chance of a
+    # random encounter (fought with the same search) against how far it
+    # leaves the player from the nearest enemy, or the portal once the stage
+    # is cleared; hub upgrades are scored by the fights the next stage
+    # should bring. Items are never picked up, since nothing uses them yet.
+    def __init__(self, seed=None, table=None):
+        self.search = BattleSearch(table)
+
+    def choose(self, engine, prompt):
+        if engine.game_state == GameState.BATTLE:
+            enemy = engine.current_enemy
+            fight = matchup(engine.player, enemy, enemy in engine.current_room.enemies)
+            return self.search.best(fight, engine.player.hp, enemy.hp)[0]
+        if engine.game_state == GameState.HUB:
+            choice = self._best_upgrade(engine)
+            if prompt.startswith("Choose an upgrade"):
+                return choice
+            return "upgrade" if choice != "3" else "continue"
+        return self._explore(engine)
+
+    def _explore(self, engine):
+        player, room, dungeon = engine.player, engine.current_room, engine.dungeon
+        grinding = False
+        if room.enemies:
+            # The stage can't be left until this fight is won, so it is taken
+            # on now unless the search would flee at once. Then there is
+            # nothing to do but earn a level-up (and its heal) from random
+            # encounters, which only happen in rooms without enemies.
+            enemy = room.enemies[0]
+            if self.search.best(matchup(player, enemy, True), player.hp, enemy.hp)[0] == "attack":
+                return "attack"
+            grinding = True
+
+        navigation = NavigationIndex.of(dungeon)
+        cleared = dungeon.is_cleared()
+        field = navigation.exit_field if cleared else navigation.enemy_field
+        encounter = self._encounter_value(engine)
+        best, best_value = None, None
+        for direction, neighbour in room.exits.items():
+            coords = neighbour.coords
+            if cleared and coords == dungeon.exit_coords:
+                return f"move {direction}"
+            if neighbour.enemies:
+                value = DEATH_VALUE if grinding else float(player.hp)
+            else:
+                value = (1 - ENCOUNTER_CHANCE) * player.hp + ENCOUNTER_CHANCE * encounter
+            steps = field.steps_from(coords)
+            value -= STEP_VALUE * (steps if steps != UNREACHABLE else dungeon.size * dungeon.size)
+            if best_value is None or value > best_value:
+                best, best_value = direction, value
+        return f"move {best}" if best is not None else "status"
+
+    def _encounter_value(self, engine):
+        # Expected result of a random encounter at the current HP
+        player = engine.player
+        total = 0.0
+        for name in WANDERING_ENEMIES:
+            template = ENEMY_REGISTRY.template(name, engine.current_stage)
+            total += self.search.value(matchup(player, template), player.hp, template.max_hp)
+        return total / len(WANDERING_ENEMIES)
+
+    def _best_upgrade(self, engine):
+        # The affordable upgrade ("1"/"2") scoring best over the next stage's
+        # expected fights, or "3" when none beats keeping the XP and gold
+        player = engine.player
+        stage = engine.current_stage + 1
+        if stage % 5 == 0:
+            enemies = [ENEMY_REGISTRY.template(BOSS_ENEMY, stage, is_boss=True)]
+            fights = 1.0
+        else:
+            enemies = [ENEMY_REGISTRY.template(name, stage) for name in WANDERING_ENEMIES]
+            rooms = engine.dungeon.size * engine.dungeon.size
+            fights = rooms * (min(1.0, 0.3 + stage * 0.05) + ENCOUNTER_CHANCE)
+
+        def score(attack, max_hp, gold, xp):
+            hp = player.hp + max_hp
+            gained = 0.0
+            for enemy in enemies:
+                fight = Matchup(max(0, player.attack + attack - enemy.defense),
+                                max(0, enemy.attack - player.defense), player.max_hp + max_hp,
+                                player.level * 100 - (player.xp - xp), enemy.xp_drop, enemy.gold_drop, True)
+                gained += self.search.value(fight, hp, enemy.max_hp) - hp
+            return hp + fights * gained / len(enemies) - XP_VALUE * xp - GOLD_VALUE * gold
+
+        best, best_score = "3", score(0, 0, 0, 0)
+        for choice, (attack, max_hp, gold, xp) in UPGRADES.items():
+            if player.gold >= gold and player.xp >= xp:
+                upgrade_score = score(attack, max_hp, gold, xp)
+                if upgrade_score > best_score:
+                    best, best_score = choice, upgrade_score
+        return best
@@ -0,0 +1,84 @@
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from game import BOSS_STAGE_SCALING, ENEMY_REGISTRY, ENEMY_STAGE_SCALING, Player
+
+STAT_FIELDS = ("max_hp", "attack", "defense", "xp_drop", "gold_drop")
+
+# Arrays of per-matchup results. `turns` is -1 for fights nobody can win
+# (neither side deals damage), in which case both HPs are left untouched.
+BattleOutcome = namedtuple("BattleOutcome", ["turns", "player_wins", "player_hp", "enemy_hp"])
+
+
+def scaled_enemy_stats(enemy_type, stages, boss=False):
+    # Same scaling as EnemyRegistry.template, for a whole array of stages at
+    # once. Returns {stat: int64 array shaped like `stages`}.
+    base = ENEMY_REGISTRY.enemy_types[enemy_type]
+    scaling = BOSS_STAGE_SCALING if boss else ENEMY_STAGE_SCALING
+    stages = np.asarray(stages, dtype=np.int64)
+    return {stat: (getattr(base, stat) * (1 + (stages - 1) * scaling[stat])).astype(np.int64)
+            for stat in STAT_FIELDS}
+
+
+def player_stats(players):
+    # Column arrays (hp, attack, defense) from a sequence of Player objects
+    return {
+        "hp": np.fromiter((player.hp for player in players), dtype=np.int64),
+        "attack": np.fromiter((player.attack for player in players), dtype=np.int64),
+        "defense": np.fromiter((player.defense for player in players), dtype=np.int64),
+    }
+
+
+def resolve_battles(player_hp, player_attack, player_defense, enemy_hp, enemy_attack, enemy_defense):
+    # Closed-form version of the attack exchange in GameEngine._battle_state:
+    # the player strikes first every turn for max(0, attack - defense), then
+    # the enemy strikes back. All arguments broadcast against each other.
+    player_hp = np.asarray(player_hp, dtype=np.int64)
+    enemy_hp = np.asarray(enemy_hp, dtype=np.int64)
+    player_damage = np.maximum(0, np.asarray(player_attack, dtype=np.int64) - enemy_defense)
+    enemy_damage = np.maximum(0, np.asarray(enemy_attack, dtype=np.int64) - player_defense)
+
+    never = np.iinfo(np.int64).max
+    # Number of hits each side needs to land (ceiling division)
+    player_turns = np.where(player_damage > 0, -(-enemy_hp // np.maximum(player_damage, 1)), never)
+    enemy_turns = np.where(enemy_damage > 0, -(-player_hp // np.maximum(enemy_damage, 1)), never)
+
+    stalemate = (player_turns == never) & (enemy_turns == never)
+    player_wins = (player_turns <= enemy_turns) & ~stalemate
+    turns = np.where(player_wins, player_turns, enemy_turns)
+    turns = np.where(stalemate, 0, turns)
+
+    # The enemy only gets to swing on turns where it survived the player's hit
+    player_hp_left = np.where(player_wins, player_hp - (turns - 1) * enemy_damage,
+                              np.where(stalemate, player_hp, 0))
+    enemy_hp_left = np.where(player_wins, 0, enemy_hp - turns * player_damage)
+
+    return BattleOutcome(turns=np.where(stalemate, -1, turns), player_wins=player_wins,
+                         player_hp=player_hp_left, enemy_hp=enemy_hp_left)
+
+
+def resolve_against_stages(player_hp, player_attack, player_defense, enemy_type, stages, boss=False):
+    # Every player stat block against `enemy_type` at every stage. Players run
+    # along the first axis and stages along the second.
+    enemy = scaled_enemy_stats(enemy_type, stages, boss=boss)
+    column = lambda values: np.asarray(values, dtype=np.int64).reshape(-1, 1)
+    return resolve_battles(column(player_hp), column(player_attack), column(player_defense),
+                           enemy["max_hp"], enemy["attack"], enemy["defense"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict battle outcomes for a fresh player across stages.")
+    parser.add_argument("--max-stage", type=int, default=500)
+    args = parser.parse_args()
+
+    stages = np.arange(1, args.max_stage + 1)
+    player = Player()
+    for enemy_type, boss in [("Slime", False), ("Skeleton", False), ("Dragon", True)]:
+        name = f"{enemy_type} (boss)" if boss else enemy_type
+        outcome = resolve_against_stages([player.hp], [player.attack], [player.defense],
+                                         enemy_type, stages, boss=boss)
+        wins = outcome.player_wins[0]
+        first_loss = stages[~wins][0] if not wins.all() else None
+        print(f"{name}: player wins {wins.sum()}/{len(stages)} stages, first loss at stage {first_loss}")
@@ -0,0 +1,70 @@
+from collections import namedtuple
+
+# A registered command: `handler(engine, args)` gets the rest of the line
+Command = namedtuple("Command", ["name", "handler", "usage"])
+
+BATCH_SEPARATOR = ";"
+UNKNOWN = (None, ())
+
+
+def split_batch(line):
+    # "n; n; take potion" -> ["n", "n", "take potion"], normalized the way
+    # commands have always been (lower case, no surrounding spaces). A blank
+    # line still counts as one (empty) command.
+    commands = [part.strip().lower() for part in line.split(BATCH_SEPARATOR)]
+    return [command for command in commands if command] or [""]
+
+
+class CommandTable:
+    # Command words -> handlers. Every name, every alias and every
+    # unambiguous prefix of a name is a key of one dict, so resolving a word
+    # is a single lookup however it was abbreviated. Aliases can carry
+    # arguments ("n" -> "move north") and win over prefixes.
+    def __init__(self):
+        self.commands = {}  # {name: Command}
+        self.aliases = {}  # {alias: (name, preset args)}
+        self._lookup = {}  # {word: (Command, preset args)}, or (None, names) if ambiguous
+
+    def register(self, name, handler, usage="", aliases=None):
+        # `aliases` maps extra words to the argument string they stand for
+        self.commands[name] = Command(name, handler, usage)
+        for alias, args in (aliases or {}).items():
+            self.aliases[alias] = (name, args)
+        self._rebuild()
+        return handler
+
+    def _rebuild(self):
+        prefixes = {}
+        for name in self.commands:
+            for end in range(1, len(name) + 1):
+                prefixes.setdefault(name[:end], []).append(name)
+        lookup = {}
+        for prefix, names in prefixes.items():
+            if len(names) == 1:
+                lookup[prefix] = (self.commands[names[0]], "")
+            else:
+                lookup[prefix] = (None, sorted(names))
+        for name, command in self.commands.items():
+            lookup[name] = (command, "")  # A full name beats being another's prefix
+        for alias, (name, args) in self.aliases.items():
+            lookup[alias] = (self.commands[name], args)
+        self._lookup = lookup
+
+    def dispatch(self, engine, line, unknown):
+        # Run the command on `line` and return what its handler returns.
+        # Unknown words print `unknown`; ambiguous ones list the candidates.
+        word, _, args = line.partition(" ")
+        command, preset = self._lookup.get(word, UNKNOWN)
+        if command is None:
+            if preset:
+                engine.output(f"'{word}' could mean: {', '.join(preset)}.")
+            else:
+                engine.output(unknown)
+            return None
+        if args:
+            args = args.strip()
+            if preset:
+                args = f"{preset} {args}"
+        else:
+            args = preset
+        return command.handler(engine, args)
@@ -0,0 +1,33 @@
+from collections import namedtuple
+
+# Events a GameEngine publishes on its `events` bus. Fields hold the live
+# objects involved (Player, Enemy), so handlers can read whatever they need.
+DamageResolved = namedtuple("DamageResolved", ["attacker", "target", "amount", "target_hp"])
+LevelUp = namedtuple("LevelUp", ["player", "level"])
+StageChanged = namedtuple("StageChanged", ["old_stage", "new_stage"])
+RandomEncounter = namedtuple("RandomEncounter", ["enemy", "stage"])
+BattleStarted = namedtuple("BattleStarted", ["enemy", "stage"])
+
+
+class EventBus:
+    # Typed publish/subscribe: handlers subscribe to an event class and get
+    # every instance emitted. Emitters test `event_type in bus.subscribers`
+    # before building an event, so an event nobody listens to costs one dict
+    # lookup and nothing is allocated.
+    def __init__(self):
+        self.subscribers = {}  # {event class: [handler, ...]}
+
+    def subscribe(self, event_type, handler):
+        self.subscribers.setdefault(event_type, []).append(handler)
+        return handler
+
+    def unsubscribe(self, event_type, handler):
+        handlers = self.subscribers.get(event_type, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self.subscribers.pop(event_type, None)
+
+    def emit(self, event):
+        for handler in self.subscribers.get(type(event), ()):
+            handler(event)
@@ -1,15 +1,72 @@
+import functools
 import random
+from collections import deque, namedtuple
 from enum import Enum
 
+import numpy as np
+
+from commands import BATCH_SEPARATOR, CommandTable, split_batch
+from events import BattleStarted, DamageResolved, EventBus, LevelUp, RandomEncounter, StageChanged
+from generators import DIRECTION_BITS, exit_masks, generate_exits, grid, place_contents
+from inventory import EMPTY_INVENTORY, Inventory
+from navigation import NavigationIndex
+from prefetch import StagePrefetch
+
+# Per-stage enemy stat multipliers: stat * (1 + (stage_level - 1) * factor)
+ENEMY_STAGE_SCALING = {"max_hp": 0.2, "attack": 0.1, "defense": 0.05, "xp_drop": 0.1, "gold_drop": 0.1}
+BOSS_STAGE_SCALING = {"max_hp": 0.5, "attack": 0.2, "defense": 0.1, "xp_drop": 0.2, "gold_drop": 0.2} # Boss HP scales more
+
+# Decorative blocks, built once and skipped entirely in terse output mode
+BATTLE_BANNER = "\n".join(["\n" + "#"*30, r"""
+██████╗  █████╗ ████████╗████████╗██╗     ███████╗
+██╔══██╗██╔══██╗╚══██╔══╝╚══██╔══╝██║     ██╔════╝
+██████╔╝███████║   ██║      ██║   ██║     █████╗  
+██╔══██╗██╔══██║   ██║      ██║   ██║     ██╔══╝  
+██████╔╝██║  ██║   ██║      ██║   ███████╗███████╗
+╚═════╝ ╚═╝  ╚═╝   ╚═╝      ╚═╝   ╚══════╝╚══════╝
+""", "#"*30])
+GAME_OVER_BANNER = "\n".join(["\n" + "="*30, r"""
+  _   _   _   _     _   _   _   _   _  
+ / \ / \ / \ / \   / \ / \ / \ / \ / \ 
+( G | A | M | E ) ( O | V | E | R | ! )
+ \_/ \_/ \_/ \_/   \_/ \_/ \_/ \_/ \_/
+""", "="*30])
+
 class GameState(Enum):
     EXPLORATION = 1
     BATTLE = 2
     HUB = 3
     GAME_OVER = 4
 
+class OutputSink(list):
+    # Collects engine output and passes it to `write` in one chunk per flush
+    # (write=None throws it away). In terse mode the decorative banners are
+    # dropped. It is a list so that sink(text) is a plain C-level append.
+    __call__ = list.append
+
+    def __init__(self, write=print, terse=False):
+        super().__init__()
+        self.write = write
+        self.terse = terse
+
+    def banner(self, text):
+        if not self.terse:
+            self.append(text)
+
+    def flush(self):
+        if self:
+            if self.write is not None:
+                self.write("\n".join(self))
+            self.clear()
+
 class Player:
-    def __init__(self, name="Hero"):
+    __slots__ = ("name", "output", "events", "max_hp", "hp", "attack", "defense", "xp", "level", "gold",
+                 "inventory")
+
+    def __init__(self, name="Hero", output=print, events=None):
         self.name = name
+        self.output = output
+        self.events = events  # EventBus to announce level-ups on, if any
         self.max_hp = 100
         self.hp = self.max_hp
         self.attack = 10
@@ -17,7 +74,7 @@ class Player:
         self.xp = 0
         self.level = 1
         self.gold = 0
-        self.inventory = []
+        self.inventory = Inventory()
 
     def take_damage(self, damage):
         self.hp -= damage
@@ -42,19 +99,18 @@ class Player:
         self.hp = self.max_hp
         self.attack += 2
         self.defense += 1
-        print(f"{self.name} leveled up to Level {self.level}!")
+        self.output(f"{self.name} leveled up to Level {self.level}!")
+        if self.events is not None and LevelUp in self.events.subscribers:
+            self.events.emit(LevelUp(self, self.level))
 
     def add_gold(self, amount):
         self.gold += amount
 
-    def add_item(self, item):
-        self.inventory.append(item)
+    def add_item(self, item, quantity=1):
+        self.inventory.add(item, quantity)
 
-    def remove_item(self, item):
-        if item in self.inventory:
-            self.inventory.remove(item)
-            return True
-        return False
+    def remove_item(self, item, quantity=1):
+        return self.inventory.remove(item, quantity) is not None
 
     def get_status(self):
         return (f"--- {self.name} Status ---\n"
@@ -64,21 +120,63 @@ class Player:
                 f"Defense: {self.defense}\n"
                 f"XP: {self.xp}\n"
                 f"Gold: {self.gold}\n"
-                f"Inventory: {', '.join(self.inventory) if self.inventory else 'Empty'}\n"
+                f"Inventory: {self.inventory.summary() or 'Empty'}\n"
                 f"--------------------------")
 
     def __str__(self):
         return self.name
 
+EnemyTemplate = namedtuple("EnemyTemplate", ["name", "max_hp", "attack", "defense", "xp_drop", "gold_drop"])
+
+# Base stats of every enemy type. New enemy types only need an entry here
+# (and in WANDERING_ENEMIES if they should roam the dungeon).
+ENEMY_TYPES = {
+    "Slime": EnemyTemplate("Slime", max_hp=30, attack=5, defense=2, xp_drop=10, gold_drop=5),
+    "Skeleton": EnemyTemplate("Skeleton", max_hp=50, attack=8, defense=4, xp_drop=20, gold_drop=10),
+    "Dragon": EnemyTemplate("Dragon", max_hp=200, attack=20, defense=10, xp_drop=100, gold_drop=50),
+}
+WANDERING_ENEMIES = ["Slime", "Skeleton"]  # Placed in rooms and met in random encounters
+DUNGEON_ITEMS = ["Health Potion", "Rusty Sword", "Small Shield"]  # Left in rooms at generation; lazy/array item codes index it from 1
+BOSS_ENEMY = "Dragon"  # Use Dragon as a boss for now
+
+
+def room_description(coords):
+    # What every room says before its stage adds to it, on every backend
+    x, y = coords
+    return f"You are in a dimly lit room at ({x},{y})."
+
+
 class Enemy:
-    def __init__(self, name, hp, attack, defense, xp_drop, gold_drop):
-        self.name = name
-        self.max_hp = hp
-        self.hp = hp
-        self.attack = attack
-        self.defense = defense
-        self.xp_drop = xp_drop
-        self.gold_drop = gold_drop
+    # Stats come from a shared, immutable EnemyTemplate; only HP is per enemy
+    __slots__ = ("template", "hp")
+
+    def __init__(self, template, hp=None):
+        self.template = template
+        self.hp = template.max_hp if hp is None else hp
+
+    @property
+    def name(self):
+        return self.template.name
+
+    @property
+    def max_hp(self):
+        return self.template.max_hp
+
+    @property
+    def attack(self):
+        return self.template.attack
+
+    @property
+    def defense(self):
+        return self.template.defense
+
+    @property
+    def xp_drop(self):
+        return self.template.xp_drop
+
+    @property
+    def gold_drop(self):
+        return self.template.gold_drop
 
     def take_damage(self, damage):
         self.hp -= damage
@@ -89,58 +187,128 @@ class Enemy:
     def __str__(self):
         return self.name
 
-class Slime(Enemy):
-    def __init__(self):
-        super().__init__("Slime", hp=30, attack=5, defense=2, xp_drop=10, gold_drop=5)
+class EnemyRegistry:
+    # Hands out stage-scaled stat blocks, computed once per
+    # (enemy type, stage, boss flag) and shared by every enemy spawned from it
+    def __init__(self, enemy_types):
+        self.enemy_types = dict(enemy_types)
+        self._scaled = {}
+
+    def register(self, template):
+        self.enemy_types[template.name] = template
+        # Drop any blocks scaled from a previous definition of this type
+        self._scaled = {key: scaled for key, scaled in self._scaled.items() if key[0] != template.name}
 
-class Skeleton(Enemy):
-    def __init__(self):
-        super().__init__("Skeleton", hp=50, attack=8, defense=4, xp_drop=20, gold_drop=10)
+    def template(self, name, stage_level=1, is_boss=False):
+        key = (name, stage_level, is_boss)
+        template = self._scaled.get(key)
+        if template is None:
+            base = self.enemy_types[name]
+            scaling = BOSS_STAGE_SCALING if is_boss else ENEMY_STAGE_SCALING
+            template = base._replace(**{stat: int(getattr(base, stat) * (1 + (stage_level - 1) * factor))
+                                        for stat, factor in scaling.items()})
+            self._scaled[key] = template
+        return template
 
-class Dragon(Enemy):
-    def __init__(self):
-        super().__init__("Dragon", hp=200, attack=20, defense=10, xp_drop=100, gold_drop=50)
+    def spawn(self, name, stage_level=1, is_boss=False):
+        return Enemy(self.template(name, stage_level, is_boss))
+
+ENEMY_REGISTRY = EnemyRegistry(ENEMY_TYPES)
 
 
 class Room:
-    def __init__(self, description, exits=None, enemies=None, items=None):
+    __slots__ = ("_description", "_description_cache", "coords", "exits", "enemies", "_items", "visited",
+                 "dungeon")
+
+    def __init__(self, description, exits=None, enemies=None, items=None, coords=None):
+        self._description_cache = None  # Rendered get_description() text
         self.description = description
+        self.coords = coords
         self.exits = exits if exits is not None else {}  # e.g., {"north": <RoomObject>}
         self.enemies = enemies if enemies is not None else []
-        self.items = items if items is not None else []
+        # Most rooms never hold an item, so they share EMPTY_INVENTORY until
+        # add_item gives them their own
+        if items is not None and not isinstance(items, Inventory):
+            items = Inventory(items)
+        self._items = items
         self.visited = False
+        self.dungeon = None  # Owning Dungeon, kept informed of enemy changes
+
+    @property
+    def description(self):
+        return self._description
+
+    @description.setter
+    def description(self, value):
+        self._description = value
+        self._description_cache = None
+
+    @property
+    def items(self):
+        return self._items if self._items is not None else EMPTY_INVENTORY
+
+    @items.setter
+    def items(self, value):
+        if value is None or value is EMPTY_INVENTORY:
+            self._items = None
+        else:
+            self._items = value if isinstance(value, Inventory) else Inventory(value)
+
+    def invalidate_description(self):
+        self._description_cache = None
 
     def add_exit(self, direction, room):
         self.exits[direction] = room
+        self._description_cache = None
 
     def add_enemy(self, enemy):
         self.enemies.append(enemy)
+        self._description_cache = None
+        if self.dungeon is not None:
+            self.dungeon._enemy_added(self)
+            self.dungeon._enemies_changed(self)
 
     def remove_enemy(self, enemy):
         if enemy in self.enemies:
             self.enemies.remove(enemy)
+            self._description_cache = None
+            if self.dungeon is not None:
+                self.dungeon._enemy_removed(self)
+                self.dungeon._enemies_changed(self)
             return True
         return False
 
     def add_item(self, item):
-        self.items.append(item)
-
+        if self._items is None:
+            self._items = Inventory()
+        self._items.add(item)
+        self._description_cache = None
+        if self.dungeon is not None:
+            self.dungeon._items_changed(self)
 
     def remove_item(self, item_name_to_remove):
-        for item in self.items:
-            if item.lower() == item_name_to_remove.lower():
-                self.items.remove(item)
-                return True
-        return False
+        if self.items.remove(item_name_to_remove) is None:
+            return False
+        self._description_cache = None
+        if self.dungeon is not None:
+            self.dungeon._items_changed(self)
+        return True
 
     def get_description(self):
+        # Only the mutators above change what this renders, so the text is
+        # rebuilt after one of them runs rather than on every call
+        if self._description_cache is None:
+            self._description_cache = self._render_description()
+        return self._description_cache
+
+    def _render_description(self):
         exit_descriptions = []
         for direction in self.exits:
             exit_descriptions.append(f"There is a door to the {direction.capitalize()}.")
         
         items_description = ""
         if self.items:
-            items_description = "You see: " + ", ".join(self.items) + "."
+            items_description = "You see: " + self.items.summary() + "."
         
         enemies_description = ""
         if self.enemies:
@@ -154,336 +322,639 @@ class Room:
 
 
 class Dungeon:
-    def __init__(self, size=5, stage_level=1, is_boss_stage=False):
+    def __init__(self, size=5, stage_level=1, is_boss_stage=False, seed=None, rng=None, generator="grid"):
+        # Generation only draws from self.rng, so a seed fixes the whole layout.
+        # `generator` names a layout from generators.GENERATORS; anything but
+        # the original "grid" is carved and stocked with NumPy from the seed.
+        if rng is None:
+            seed = seed if seed is not None else random.getrandbits(64)
+            rng = random.Random(seed)
+        self.seed = seed
+        self.rng = rng
         self.size = size
         self.stage_level = stage_level
         self.is_boss_stage = is_boss_stage
+        self.generator = generator
         self.rooms = {}  # {(x, y): RoomObject}
         self.start_room_coords = (0, 0)
+        self.exit_coords = (size - 1, size - 1)
+        self.navigation = None  # NavigationIndex, built on first use
+        self.item_rooms = {}  # {(x, y): RoomObject} for rooms holding items, maintained like enemy_rooms
+        self.visited_coords = set()  # Rooms marked through mark_visited
+        self._init_enemy_index()
         self._generate_dungeon()
 
+    def _init_enemy_index(self):
+        # Live-enemy index, maintained by Room.add_enemy/remove_enemy
+        self.enemy_count = 0
+        self.enemy_rooms = {}  # {(x, y): RoomObject} for rooms with enemies left
+
     def _generate_dungeon(self):
-        # Create a grid of rooms
-        for x in range(self.size):
-            for y in range(self.size):
-                description = f"You are in a dimly lit room at ({x},{y})."
-                self.rooms[(x, y)] = Room(description)
-
-        # Connect rooms randomly
-        for x in range(self.size):
-            for y in range(self.size):
-                current_room = self.rooms[(x, y)]
-
-                # Connect North-South
-                if y < self.size - 1:
-                    north_room = self.rooms[(x, y + 1)]
-                    current_room.add_exit("north", north_room)
-                    north_room.add_exit("south", current_room)
-
-                # Connect East-West
-                if x < self.size - 1:
-                    east_room = self.rooms[(x + 1, y)]
-                    current_room.add_exit("east", east_room)
-                    east_room.add_exit("west", current_room)
+        if self.generator != "grid":
+            rng, floor = self._carve_rooms()
+        else:
+            # Create a grid of rooms
+            for x in range(self.size):
+                for y in range(self.size):
+                    room = Room(room_description((x, y)), coords=(x, y))
+                    room.dungeon = self
+                    self.rooms[(x, y)] = room
+
+            # Connect rooms randomly
+            for x in range(self.size):
+                for y in range(self.size):
+                    current_room = self.rooms[(x, y)]
+
+                    # Connect North-South
+                    if y < self.size - 1:
+                        north_room = self.rooms[(x, y + 1)]
+                        current_room.add_exit("north", north_room)
+                        north_room.add_exit("south", current_room)
+
+                    # Connect East-West
+                    if x < self.size - 1:
+                        east_room = self.rooms[(x + 1, y)]
+                        current_room.add_exit("east", east_room)
+                        east_room.add_exit("west", current_room)
 
         # Add enemies and items
         if self.is_boss_stage:
             # Place boss in the exit room
-            boss_room_coords = (self.size - 1, self.size - 1)
-            boss_room = self.rooms[boss_room_coords]
+            boss_room = self.rooms[self.exit_coords]
             
-            boss = Dragon() # Use Dragon as a boss for now
-            boss.max_hp = int(boss.max_hp * (1 + (self.stage_level - 1) * 0.5)) # Boss HP scales more
-            boss.hp = boss.max_hp
-            boss.attack = int(boss.attack * (1 + (self.stage_level - 1) * 0.2))
-            boss.defense = int(boss.defense * (1 + (self.stage_level - 1) * 0.1))
-            boss.xp_drop = int(boss.xp_drop * (1 + (self.stage_level - 1) * 0.2))
-            boss.gold_drop = int(boss.gold_drop * (1 + (self.stage_level - 1) * 0.2))
+            boss = ENEMY_REGISTRY.spawn(BOSS_ENEMY, self.stage_level, is_boss=True)
             boss_room.add_enemy(boss)
-            boss_room.description += f" A fearsome {boss.name} guards the portal to the next stage!"
+        elif self.generator != "grid":
+            self._place_contents(rng, floor)
         else:
             # Add some random enemies and items to rooms (excluding the starting room)
             for coords, room in self.rooms.items():
                 if coords != self.start_room_coords:
-                    if random.random() < 0.3 + (self.stage_level * 0.05):  # Increased chance for enemies per stage
-                        enemy_type = random.choice([Slime, Skeleton])
+                    if self.rng.random() < 0.3 + (self.stage_level * 0.05):  # Increased chance for enemies per stage
+                        enemy_type = self.rng.choice(WANDERING_ENEMIES)
                         # Scale enemy stats based on stage_level
-                        scaled_enemy = enemy_type()
-                        scaled_enemy.max_hp = int(scaled_enemy.max_hp * (1 + (self.stage_level - 1) * 0.2))
-                        scaled_enemy.hp = scaled_enemy.max_hp
-                        scaled_enemy.attack = int(scaled_enemy.attack * (1 + (self.stage_level - 1) * 0.1))
-                        scaled_enemy.defense = int(scaled_enemy.defense * (1 + (self.stage_level - 1) * 0.05))
-                        scaled_enemy.xp_drop = int(scaled_enemy.xp_drop * (1 + (self.stage_level - 1) * 0.1))
-                        scaled_enemy.gold_drop = int(scaled_enemy.gold_drop * (1 + (self.stage_level - 1) * 0.1))
-                        room.add_enemy(scaled_enemy)
-                    if random.random() < 0.2:  # 20% chance for an item
-                        room.add_item(random.choice(["Health Potion", "Rusty Sword", "Small Shield"]))
+                        room.add_enemy(ENEMY_REGISTRY.spawn(enemy_type, self.stage_level))
+                    if self.rng.random() < 0.2:  # 20% chance for an item
+                        room.add_item(self.rng.choice(DUNGEON_ITEMS))
 
         # Designate an exit room for stage progression (e.g., bottom-right corner)
-        exit_coords = (self.size - 1, self.size - 1)
-        if exit_coords != self.start_room_coords and not self.is_boss_stage: # Ensure exit is not start and not boss stage
-            exit_room = self.rooms[exit_coords]
-            exit_room.description += " A glowing portal shimmers in the corner, leading to the next stage."
+        self.rooms[self.exit_coords].description += self._description_suffix(self.exit_coords)
+
+    def _description_suffix(self, coords):
+        # What the room at coords adds to room_description(): the boss or
+        # portal text of the exit room, which every backend takes from here
+        if coords != self.exit_coords:
+            return ""
+        if self.is_boss_stage:
+            return f" A fearsome {BOSS_ENEMY} guards the portal to the next stage!"
+        if coords == self.start_room_coords:
+            return ""  # A one-room stage has no portal to show
+        return " A glowing portal shimmers in the corner, leading to the next stage."
+
+    def _carve_rooms(self):
+        # Rooms only where the generator carved (plus the start room), linked
+        # in the same exit order as the grid. Returns the NumPy generator
+        # the rest of the stage is drawn from and the mask of carved cells.
+        if self.seed is None:
+            self.seed = self.rng.getrandbits(64)
+        size = self.size
+        rng = np.random.default_rng(self.seed)
+        masks = self._exit_masks = generate_exits(self.generator, size, rng)
+        floor = masks != 0
+        floor[self.start_room_coords[0] * size + self.start_room_coords[1]] = True
+        rooms = self.rooms
+        for index in np.flatnonzero(floor).tolist():
+            x, y = divmod(index, size)
+            room = Room(room_description((x, y)), coords=(x, y))
+            room.dungeon = self
+            rooms[(x, y)] = room
+
+        links = [(direction, DIRECTION_BITS[direction], dx, dy)
+                 for direction, dx, dy in (("west", -1, 0), ("south", 0, -1), ("north", 0, 1), ("east", 1, 0))]
+        masks = masks.tolist()
+        for (x, y), room in rooms.items():
+            mask = masks[x * size + y]
+            for direction, bit, dx, dy in links:
+                if mask & bit:
+                    room.exits[direction] = rooms[(x + dx, y + dy)]
+        return rng, floor
+
+    def _place_contents(self, rng, floor):
+        # Wandering enemies and items for a carved layout, drawn in one batch
+        size = self.size
+        start = self.start_room_coords[0] * size + self.start_room_coords[1]
+        enemy_kind, items = place_contents(rng, size * size, start, self.stage_level,
+                                           len(WANDERING_ENEMIES), len(DUNGEON_ITEMS), floor)
+        for index in np.flatnonzero(enemy_kind >= 0).tolist():
+            self.rooms[divmod(index, size)].add_enemy(
+                ENEMY_REGISTRY.spawn(WANDERING_ENEMIES[enemy_kind[index]], self.stage_level))
+        for index in np.flatnonzero(items).tolist():
+            self.rooms[divmod(index, size)].add_item(DUNGEON_ITEMS[items[index] - 1])
+
+    def exit_bitmasks(self):
+        # Every cell's exits as generated, as generators.DIRECTION_BITS masks
+        # (index x * size + y), without walking the rooms
+        if self.generator == "grid":
+            return exit_masks(*grid(self.size, None))
+        return self._exit_masks
 
     def get_room(self, coords):
         return self.rooms.get(coords)
 
+    def _enemy_added(self, room):
+        self.enemy_count += 1
+        self.enemy_rooms[room.coords] = room
+
+    def _enemy_removed(self, room):
+        self.enemy_count -= 1
+        if not room.enemies:
+            self.enemy_rooms.pop(room.coords, None)
+
+    def _items_changed(self, room):
+        if room.items:
+            self.item_rooms[room.coords] = room
+        else:
+            self.item_rooms.pop(room.coords, None)
+
+    def mark_visited(self, room):
+        room.visited = True
+        self.visited_coords.add(room.coords)
+
+    def _enemies_changed(self, room):
+        # Called by Room after the enemy index hooks above
+        if self.navigation is not None:
+            self.navigation.enemies_changed(room.coords, bool(room.enemies))
+
+    def is_cleared(self):
+        return self.enemy_count == 0
+
+    def rooms_with_enemies_remaining(self):
+        return len(self.enemy_rooms)
+
+    def enemy_coords(self):
+        # Coordinates of every room with enemies left
+        return list(self.enemy_rooms)
+
+    def neighbours(self, coords):
+        # [(direction, neighbour coords)] for the exits of the room at coords
+        return [(direction, room.coords) for direction, room in self.get_room(coords).exits.items()]
+
     def get_start_room(self):
         return self.rooms[self.start_room_coords]
 
 class GameEngine:
-    def __init__(self):
-        self.player = Player()
+    def __init__(self, input_func=input, output_func=print, dungeon_factory=Dungeon, seed=None, rng=None,
+                 terse=False, dungeon=None, prefetch_stages=True):
+        # Every roll in a session (dungeon seeds, encounters, flee attempts)
+        # comes from self.rng, so the seed plus the commands typed replay it
+        if rng is None:
+            seed = seed if seed is not None else random.getrandbits(64)
+            rng = random.Random(seed)
+        self.seed = seed
+        self.rng = rng
+        # Console I/O by default; headless drivers pass their own callables.
+        # Async front ends drive turn() themselves and never call input_func.
+        self.input = input_func
+        self.output = output_func if isinstance(output_func, OutputSink) else OutputSink(output_func, terse)
+        self.dungeon_factory = dungeon_factory  # Dungeon or a subclass such as LazyDungeon
+        self.events = EventBus()
+        self.metrics = None  # GameMetrics timing each turn, see metrics.py
+        self.player = Player(output=self.output, events=self.events)
         self.current_stage = 1
-        self.dungeon = Dungeon(stage_level=self.current_stage)
+        # A ready-made `dungeon` (e.g. from a saved game) replaces stage 1's
+        self.dungeon = dungeon if dungeon is not None else self._create_dungeon(self.current_stage)
         self.current_room = self.dungeon.get_start_room()
         self.game_state = GameState.EXPLORATION
         self.current_enemy = None # For battle state
+        self.pending_commands = deque()  # Rest of a batch line, run before asking again
+        # Build the next stage in the background while the player is in the hub
+        self.prefetch_stages = prefetch_stages
+        self.next_stage_prefetch = None
+
+    def _create_dungeon(self, stage_level):
+        return self._dungeon_builder(stage_level)()
+
+    def _dungeon_builder(self, stage_level):
+        # A callable building the stage. Its seed is drawn here, so the stage
+        # comes out the same whenever and on whichever thread it is built.
+        is_boss_stage = (stage_level % 5 == 0)
+        return functools.partial(self.dungeon_factory, stage_level=stage_level, is_boss_stage=is_boss_stage,
+                                 seed=self.rng.getrandbits(64))
 
     def start_game(self):
-        print("Welcome to the Python Dungeon Crawler!")
+        self.output("Welcome to the Python Dungeon Crawler!")
         self.game_loop()
 
     def game_loop(self):
         while self.game_state != GameState.GAME_OVER:
-            if self.game_state == GameState.EXPLORATION:
-                self._exploration_state()
-            elif self.game_state == GameState.BATTLE:
-                self._battle_state()
-            elif self.game_state == GameState.HUB:
-                self._hub_state()
-            
-            # Simple check for game over (player defeated)
-            if self.player.hp <= 0:
-                self.game_state = GameState.GAME_OVER
-                print("\n" + "="*30)
-                print(r"""
-  _   _   _   _     _   _   _   _   _  
- / \ / \ / \ / \   / \ / \ / \ / \ / \ 
-( G | A | M | E ) ( O | V | E | R | ! )
- \_/ \_/ \_/ \_/   \_/ \_/ \_/ \_/ \_/
-""")
-                print("="*30)
-                print("You have been defeated!")
+            self.step()
+
+    def step(self):
+        # Run a single turn, answering its prompts with self.input. Buffered
+        # output goes out right before each prompt (turn() flushes the rest).
+        turn = self.turn()
+        try:
+            prompt = next(turn)
+            while True:
+                self.output.flush()
+                prompt = turn.send(self.input(prompt))
+        except StopIteration:
+            pass
+
+    def turn(self):
+        # One turn of whichever state the game is in, as a generator: it
+        # yields each prompt and expects the player's command to be sent back.
+        # With metrics attached, the time spent outside the prompts is recorded.
+        if self.metrics is not None:
+            return self.metrics.timed_turn(self, self._turn())
+        return self._turn()
+
+    def _turn(self):
+        # Drivers flush self.output before showing a prompt; whatever is left
+        # at the end of the turn is flushed here, unless commands from a
+        # batch line are still queued, so a batch's results come out together.
+        if self.game_state == GameState.EXPLORATION:
+            yield from self._exploration_state()
+        elif self.game_state == GameState.BATTLE:
+            yield from self._battle_state()
+        elif self.game_state == GameState.HUB:
+            yield from self._hub_state()
+
+        # Simple check for game over (player defeated)
+        if self.player.hp <= 0:
+            self.game_state = GameState.GAME_OVER
+            self.output.banner(GAME_OVER_BANNER)
+            self.output("You have been defeated!")
+            self.pending_commands.clear()
+        if not self.pending_commands:
+            self.output.flush()
 
     def next_stage(self):
-        print("\nYou have cleared the current stage!")
+        self.output("\nYou have cleared the current stage!")
         self.game_state = GameState.HUB # Transition to hub state
 
+    def _read_command(self, prompt):
+        # The next command for the current prompt: left over from a batch
+        # line ("n; n; attack"), or asked for, in which case the whole line
+        # is queued and its first command returned
+        if self.pending_commands:
+            return self.pending_commands.popleft()
+        line = yield prompt
+        if BATCH_SEPARATOR not in line:
+            return line.lower().strip()
+        first, *rest = split_batch(line)
+        self.pending_commands.extend(rest)
+        return first
+
     def _hub_state(self):
-        print("\n" + "="*30)
-        print("WELCOME TO THE HUB")
-        print("="*30)
-        print("Here you can rest, upgrade your stats, or buy items.")
-        
-        while True:
-            choice = input("What would you like to do? [Upgrade, Shop (not implemented), Continue] ").lower().strip()
-            if choice == "upgrade":
-                self._handle_upgrades()
-            elif choice == "shop":
-                print("The shopkeeper is currently away. Come back later!")
-            elif choice == "continue":
-                self.current_stage += 1
-                print(f"\n--- Entering Stage {self.current_stage}! ---\n")
-                
-                is_boss_stage = (self.current_stage % 5 == 0)
-                self.dungeon = Dungeon(stage_level=self.current_stage, is_boss_stage=is_boss_stage)
-                self.current_room = self.dungeon.get_start_room()
-                self.game_state = GameState.EXPLORATION
-                break
-            else:
-                print("Invalid choice.")
+        # Nothing in the hub draws from self.rng, so taking the next stage's
+        # seed now leaves every later roll as it would have been
+        if self.prefetch_stages and self.next_stage_prefetch is None:
+            self.next_stage_prefetch = StagePrefetch(self._dungeon_builder(self.current_stage + 1))
+
+        self.output.banner("\n" + "="*30)
+        self.output("WELCOME TO THE HUB")
+        self.output.banner("="*30)
+        self.output("Here you can rest, upgrade your stats, or buy items.")
+
+        while self.game_state == GameState.HUB:
+            choice = yield from self._read_command("What would you like to do? [Upgrade, Shop (not implemented), Continue] ")
+            # Hub commands may hand back a sub-menu that asks questions of its own
+            menu = HUB_COMMANDS.dispatch(self, choice, "Invalid choice.")
+            if menu is not None:
+                yield from menu
+
+    def _hub_upgrade(self, args):
+        return self._handle_upgrades()
+
+    def _hub_shop(self, args):
+        self.output("The shopkeeper is currently away. Come back later!")
+
+    def _hub_continue(self, args):
+        self.current_stage += 1
+        self.output(f"\n--- Entering Stage {self.current_stage}! ---\n")
+        if StageChanged in self.events.subscribers:
+            self.events.emit(StageChanged(self.current_stage - 1, self.current_stage))
+
+        if self.next_stage_prefetch is not None:
+            self.dungeon = self.next_stage_prefetch.take()
+            self.next_stage_prefetch = None
+        else:
+            self.dungeon = self._create_dungeon(self.current_stage)
+        self.current_room = self.dungeon.get_start_room()
+        self.game_state = GameState.EXPLORATION
 
     def _handle_upgrades(self):
-        print("\n--- UPGRADE STATS ---")
-        print(f"Current Gold: {self.player.gold}")
-        print(f"Current XP: {self.player.xp}")
-        print(f"1. Upgrade Attack (+5 Attack, Cost: 20 Gold, 50 XP)")
-        print(f"2. Upgrade Max HP (+20 Max HP, Cost: 15 Gold, 40 XP)")
-        print(f"3. Back")
-
-        while True:
-            upgrade_choice = input("Choose an upgrade: ").lower().strip()
-            if upgrade_choice == "1":
-                if self.player.gold >= 20 and self.player.xp >= 50:
-                    self.player.attack += 5
-                    self.player.gold -= 20
-                    self.player.xp -= 50
-                    print(f"Attack upgraded! New Attack: {self.player.attack}")
-                else:
-                    print("Not enough gold or XP.")
-                break
-            elif upgrade_choice == "2":
-                if self.player.gold >= 15 and self.player.xp >= 40:
-                    self.player.max_hp += 20
-                    self.player.hp += 20 # Heal player to new max hp
-                    self.player.gold -= 15
-                    self.player.xp -= 40
-                    print(f"Max HP upgraded! New Max HP: {self.player.max_hp}, Current HP: {self.player.hp}")
-                else:
-                    print("Not enough gold or XP.")
-                break
-            elif upgrade_choice == "3":
-                break
-            else:
-                print("Invalid choice.")
+        self.output("\n--- UPGRADE STATS ---")
+        self.output(f"Current Gold: {self.player.gold}")
+        self.output(f"Current XP: {self.player.xp}")
+        self.output(f"1. Upgrade Attack (+5 Attack, Cost: 20 Gold, 50 XP)")
+        self.output(f"2. Upgrade Max HP (+20 Max HP, Cost: 15 Gold, 40 XP)")
+        self.output(f"3. Back")
+
+        done = None
+        while not done:
+            upgrade_choice = yield from self._read_command("Choose an upgrade: ")
+            done = UPGRADE_COMMANDS.dispatch(self, upgrade_choice, "Invalid choice.")
+
+    def _upgrade_attack(self, args):
+        if self.player.gold >= 20 and self.player.xp >= 50:
+            self.player.attack += 5
+            self.player.gold -= 20
+            self.player.xp -= 50
+            self.output(f"Attack upgraded! New Attack: {self.player.attack}")
+        else:
+            self.output("Not enough gold or XP.")
+        return True
+
+    def _upgrade_max_hp(self, args):
+        if self.player.gold >= 15 and self.player.xp >= 40:
+            self.player.max_hp += 20
+            self.player.hp += 20 # Heal player to new max hp
+            self.player.gold -= 15
+            self.player.xp -= 40
+            self.output(f"Max HP upgraded! New Max HP: {self.player.max_hp}, Current HP: {self.player.hp}")
+        else:
+            self.output("Not enough gold or XP.")
+        return True
+
+    def _upgrade_back(self, args):
+        return True
 
     def _exploration_state(self):
-        print("\n" + "="*30)
-        print(f"EXPLORATION (Stage {self.current_stage})")
-        print("="*30)
-        print(self.current_room.get_description())
-
-        # Check if player is in the exit room
-        exit_coords = (self.dungeon.size - 1, self.dungeon.size - 1)
-        if (self.current_room == self.dungeon.rooms.get(exit_coords) and
-            all(not room.enemies for room in self.dungeon.rooms.values())): # Check if all enemies in dungeon are defeated
-            print("\nYou found the exit to the next stage!")
+        self.output.banner("\n" + "="*30)
+        self.output.banner(f"EXPLORATION (Stage {self.current_stage})")
+        self.output.banner("="*30)
+        self.output(self.current_room.get_description())
+        self.dungeon.mark_visited(self.current_room)
+
+        # Check if player is in the exit room and all enemies in dungeon are defeated
+        if self.current_room.coords == self.dungeon.exit_coords and self.dungeon.is_cleared():
+            self.output("\nYou found the exit to the next stage!")
             self.next_stage()
             return # Skip command parsing for this turn to display new room description
         
         # Random encounter chance if no enemies in current room
-        if not self.current_room.enemies and random.random() < 0.2: 
-            enemy_type = random.choice([Slime, Skeleton])
-            scaled_enemy = enemy_type()
-            scaled_enemy.max_hp = int(scaled_enemy.max_hp * (1 + (self.current_stage - 1) * 0.2))
-            scaled_enemy.hp = scaled_enemy.max_hp
-            scaled_enemy.attack = int(scaled_enemy.attack * (1 + (self.current_stage - 1) * 0.1))
-            scaled_enemy.defense = int(scaled_enemy.defense * (1 + (self.current_stage - 1) * 0.05))
-            scaled_enemy.xp_drop = int(scaled_enemy.xp_drop * (1 + (self.current_stage - 1) * 0.1))
-            scaled_enemy.gold_drop = int(scaled_enemy.gold_drop * (1 + (self.current_stage - 1) * 0.1))
-            self.current_enemy = scaled_enemy
-
-            print(f"A wild {self.current_enemy.name} appears!")
-            self.game_state = GameState.BATTLE
+        if not self.current_room.enemies and self.rng.random() < 0.2: 
+            self._random_encounter()
             return
-            
-        command = input("What do you want to do? ").lower().strip()
+
+        command = yield from self._read_command("What do you want to do? ")
         self._parse_exploration_command(command)
 
+    def _random_encounter(self):
+        # A wandering enemy jumps the player, who has already lost the roll
+        enemy_type = self.rng.choice(WANDERING_ENEMIES)
+        self.current_enemy = ENEMY_REGISTRY.spawn(enemy_type, self.current_stage)
+
+        self.output(f"A wild {self.current_enemy.name} appears!")
+        if self.events.subscribers:
+            if RandomEncounter in self.events.subscribers:
+                self.events.emit(RandomEncounter(self.current_enemy, self.current_stage))
+            if BattleStarted in self.events.subscribers:
+                self.events.emit(BattleStarted(self.current_enemy, self.current_stage))
+        if self.pending_commands:
+            # The rest of a batch was meant for exploring, not for a fight
+            self.pending_commands.clear()
+            self.output("Your remaining commands are interrupted!")
+        self.game_state = GameState.BATTLE
+
 
     def _battle_state(self):
-        print("\n" + "#"*30)
-        print(r"""
-██████╗  █████╗ ████████╗████████╗██╗     ███████╗
-██╔══██╗██╔══██╗╚══██╔══╝╚══██╔══╝██║     ██╔════╝
-██████╔╝███████║   ██║      ██║   ██║     █████╗  
-██╔══██╗██╔══██║   ██║      ██║   ██║     ██╔══╝  
-██████╔╝██║  ██║   ██║      ██║   ███████╗███████╗
-╚═════╝ ╚═╝  ╚═╝   ╚═╝      ╚═╝   ╚══════╝╚══════╝
-""")
-        print("#"*30)
+        self.output.banner(BATTLE_BANNER)
 
         # Display stats
-        print(f"{self.player.name} HP: {self.player.hp}/{self.player.max_hp} | Attack: {self.player.attack} | Defense: {self.player.defense}")
-        print(f"{self.current_enemy.name} HP: {self.current_enemy.hp}/{self.current_enemy.max_hp} | Attack: {self.current_enemy.attack} | Defense: {self.current_enemy.defense}")
-        print("-"*30)
+        self.output(f"{self.player.name} HP: {self.player.hp}/{self.player.max_hp} | Attack: {self.player.attack} | Defense: {self.player.defense}")
+        self.output(f"{self.current_enemy.name} HP: {self.current_enemy.hp}/{self.current_enemy.max_hp} | Attack: {self.current_enemy.attack} | Defense: {self.current_enemy.defense}")
+        self.output.banner("-"*30)
 
-        action = input("Choose an action: [Attack, Magic, Item, Flee] ").lower().strip()
-        
-        player_turn_over = False
+        action = yield from self._read_command("Choose an action: [Attack, Magic, Item, Flee] ")
 
-        if action == "attack":
-            player_damage = max(0, self.player.attack - self.current_enemy.defense)
-            enemy_dead = self.current_enemy.take_damage(player_damage)
-            print(f"You attack the {self.current_enemy.name} for {player_damage} damage.")
-            player_turn_over = True
-            
-            if enemy_dead:
-                print(f"The {self.current_enemy.name} is defeated!")
-                self.player.add_xp(self.current_enemy.xp_drop)
-                self.player.add_gold(self.current_enemy.gold_drop)
-                print(f"You gained {self.current_enemy.xp_drop} XP and {self.current_enemy.gold_drop} gold.")
-                self.current_room.remove_enemy(self.current_enemy) # Remove enemy from the room
-                self.game_state = GameState.EXPLORATION
-                self.current_enemy = None
-                return # Battle ends here
-        elif action == "magic":
-            print("You wave your hands, but nothing happens. (Magic not implemented yet)")
-            player_turn_over = True
-        elif action == "item":
-            print("You fumble in your bag. (Items not implemented yet)")
-            player_turn_over = True
-        elif action == "flee":
-            if random.random() > 0.5: # 50% chance to flee
-                print("You successfully fled the battle!")
-                self.game_state = GameState.EXPLORATION
-                self.current_enemy = None
-                return # Battle ends here
-            else:
-                print("You failed to flee!")
-                player_turn_over = True
-        else:
-            print("Invalid battle action. You lose your turn.")
-            player_turn_over = True
+        # Handlers return whether the player's turn is over; anything that
+        # isn't an action costs the turn too
+        player_turn_over = BATTLE_COMMANDS.dispatch(self, action, "Invalid battle action. You lose your turn.")
 
         # Enemy's turn if player's turn is over and battle is still ongoing
-        if player_turn_over and self.game_state == GameState.BATTLE:
+        if player_turn_over is not False and self.game_state == GameState.BATTLE:
             enemy_damage = max(0, self.current_enemy.attack - self.player.defense)
             player_dead = self.player.take_damage(enemy_damage)
-            print(f"The {self.current_enemy.name} attacks you for {enemy_damage} damage.")
+            self.output(f"The {self.current_enemy.name} attacks you for {enemy_damage} damage.")
+            if DamageResolved in self.events.subscribers:
+                self.events.emit(DamageResolved(self.current_enemy, self.player, enemy_damage, self.player.hp))
             if player_dead:
-                print("You have been defeated!")
+                self.output("You have been defeated!")
                 self.game_state = GameState.GAME_OVER
 
+    def _battle_attack(self, args):
+        player_damage = max(0, self.player.attack - self.current_enemy.defense)
+        enemy_dead = self.current_enemy.take_damage(player_damage)
+        self.output(f"You attack the {self.current_enemy.name} for {player_damage} damage.")
+        if DamageResolved in self.events.subscribers:
+            self.events.emit(DamageResolved(self.player, self.current_enemy, player_damage, self.current_enemy.hp))
+
+        if enemy_dead:
+            self.output(f"The {self.current_enemy.name} is defeated!")
+            self.player.add_xp(self.current_enemy.xp_drop)
+            self.player.add_gold(self.current_enemy.gold_drop)
+            self.output(f"You gained {self.current_enemy.xp_drop} XP and {self.current_enemy.gold_drop} gold.")
+            self.current_room.remove_enemy(self.current_enemy) # Remove enemy from the room
+            self.game_state = GameState.EXPLORATION
+            self.current_enemy = None
+            return False # Battle ends here
+        return True
+
+    def _battle_magic(self, args):
+        self.output("You wave your hands, but nothing happens. (Magic not implemented yet)")
+        return True
+
+    def _battle_item(self, args):
+        self.output("You fumble in your bag. (Items not implemented yet)")
+        return True
+
+    def _battle_flee(self, args):
+        if self.rng.random() > 0.5: # 50% chance to flee
+            self.output("You successfully fled the battle!")
+            self.game_state = GameState.EXPLORATION
+            self.current_enemy = None
+            return False # Battle ends here
+        self.output("You failed to flee!")
+        return True
+
 
     def _parse_exploration_command(self, command):
-        if command.startswith("move"):
-            # Split only once to handle multi-word directions like "move north" or "move portal"
-            parts = command.split(" ", 1) 
-            if len(parts) > 1:
-                direction = parts[1]
-                if direction == "portal":
-                    exit_coords = (self.dungeon.size - 1, self.dungeon.size - 1)
-                    if (self.current_room == self.dungeon.rooms.get(exit_coords) and
-                        all(not room.enemies for room in self.dungeon.rooms.values())):
-                        print("You step into the shimmering portal...")
-                        self.next_stage()
-                    else:
-                        print("There is no active portal here, or the current stage is not yet cleared.")
-                else:
-                    self._move_player(direction)
+        EXPLORATION_COMMANDS.dispatch(self, command, "Unknown command. Type 'help' for available commands.")
+
+    def _move_command(self, args):
+        if not args:
+            self.output("Move where? Specify a direction (e.g., 'move north') or 'move portal'.")
+        elif args == "portal":
+            if self.current_room.coords == self.dungeon.exit_coords and self.dungeon.is_cleared():
+                self.output("You step into the shimmering portal...")
+                self.next_stage()
             else:
-                print("Move where? Specify a direction (e.g., 'move north') or 'move portal'.")
-        elif command == "status":
-            print(self.player.get_status())
-        elif command == "inventory":
-            print(f"Inventory: {', '.join(self.player.inventory) if self.player.inventory else 'Empty'}")
-        elif command.startswith("take"):
-            item_name = " ".join(command.split(" ")[1:])
-            if self.current_room.remove_item(item_name):
-                self.player.add_item(item_name)
-                print(f"You took the {item_name}.")
-            else:
-                print(f"Could not find '{item_name}' in this room.")
-        elif command.startswith("attack"):
-            if self.current_room.enemies:
-                print(f"You prepare to fight the {self.current_room.enemies[0].name}!")
-                self.current_enemy = self.current_room.enemies[0] # Target the first enemy
-                self.game_state = GameState.BATTLE
-            else:
-                print("There are no enemies to attack in this room.")
-        elif command == "help":
-            print("\n--- Available Commands ---")
-            print("  move <direction> (e.g., 'move north', 'move east')")
-            print("  move portal (to advance to the next stage if cleared)")
-            print("  status (display player stats)")
-            print("  inventory (display player inventory)")
-            print("  take <item name> (pick up an item from the room)")
-            print("  attack (initiate battle with an enemy in the room)")
-            print("  help (display this list)")
-            print("--------------------------")
+                self.output("There is no active portal here, or the current stage is not yet cleared.")
         else:
-            print("Unknown command. Type 'help' for available commands.")
+            self._move_player(DIRECTION_ABBREVIATIONS.get(args, args))
+
+    def _status_command(self, args):
+        self.output(self.player.get_status())
 
+    def _inventory_command(self, args):
+        self.output(f"Inventory: {self.player.inventory.summary() or 'Empty'}")
+
+    def _take_command(self, item_name):
+        if self.current_room.remove_item(item_name):
+            self.player.add_item(item_name)
+            self.output(f"You took the {item_name}.")
+        else:
+            self.output(f"Could not find '{item_name}' in this room.")
+
+    def _attack_command(self, args):
+        if self.current_room.enemies:
+            self.output(f"You prepare to fight the {self.current_room.enemies[0].name}!")
+            self.current_enemy = self.current_room.enemies[0] # Target the first enemy
+            self.game_state = GameState.BATTLE
+            if BattleStarted in self.events.subscribers:
+                self.events.emit(BattleStarted(self.current_enemy, self.current_stage))
+        else:
+            self.output("There are no enemies to attack in this room.")
+
+    def _help_command(self, args):
+        self.output("\n--- Available Commands ---")
+        self.output("  move <direction> (e.g., 'move north', 'move east')")
+        self.output("  move portal (to advance to the next stage if cleared)")
+        self.output("  status (display player stats)")
+        self.output("  inventory (display player inventory)")
+        self.output("  take <item name> (pick up an item from the room)")
+        self.output("  attack (initiate battle with an enemy in the room)")
+        self.output("  goto <x,y> / goto portal / goto nearest enemy (walk the whole way)")
+        self.output("  explore (walk to unvisited rooms until something turns up)")
+        self.output("  help (display this list)")
+        self.output("  Shortcuts: n/s/e/w to move, a to attack, or any unambiguous start of a command.")
+        self.output("  Chain commands with ';', e.g. 'n; n; take health potion'.")
+        self.output("--------------------------")
 
     def _move_player(self, direction):
         new_room = self.current_room.exits.get(direction)
         if new_room:
             self.current_room = new_room
-            print(f"You moved {direction}.")
+            self.output(f"You moved {direction}.")
+        else:
+            self.output("You can't go that way.")
+
+    def _goto(self, target):
+        navigation = NavigationIndex.of(self.dungeon)
+        start = self.current_room.coords
+        if target == "portal":
+            path = navigation.path_to_exit(start)
+        elif target in ("nearest enemy", "enemy"):
+            if self.dungeon.is_cleared():
+                self.output("There are no enemies left on this stage.")
+                return
+            path = navigation.path_to_nearest_enemy(start)
+        else:
+            try:
+                x, y = (int(part) for part in target.strip("()").split(","))
+            except ValueError:
+                self.output("Go where? Try 'goto 3,4', 'goto portal' or 'goto nearest enemy'.")
+                return
+            path = navigation.path(start, (x, y))
+
+        if path is None:
+            self.output("You can't find a way there.")
+        elif not path:
+            self.output("You are already there.")
+        else:
+            self._follow_path(path)
+
+    def _explore(self, args=""):
+        # Keep heading for the nearest unvisited room, stopping wherever
+        # there is something to fight or pick up. The cap matters for lazy
+        # dungeons, whose rooms forget they were visited once evicted.
+        navigation = NavigationIndex.of(self.dungeon)
+        steps = 0
+        encounter = False
+        while steps < self.dungeon.size * self.dungeon.size:
+            path = navigation.path_to_nearest(self.current_room.coords,
+                                              lambda coords: not self.dungeon.get_room(coords).visited)
+            if path is None:
+                break
+            if steps and self.rng.random() < 0.2:
+                # The roll for the room the last leg ended in, now that the
+                # walk goes on instead of leaving it to the next turn
+                encounter = True
+                break
+            walked, encounter = self._follow_path(path, report=False)
+            steps += walked
+            self.dungeon.mark_visited(self.current_room)
+            if encounter or self.current_room.enemies or self.current_room.items:
+                break
+
+        if steps:
+            x, y = self.current_room.coords
+            self.output(f"You explore {steps} room{'s' if steps != 1 else ''} and stop at ({x},{y}).")
         else:
-            print("You can't go that way.")
+            self.output("There is nothing left to explore here.")
+        if encounter:
+            self._random_encounter()
+
+    def _follow_path(self, path, report=True):
+        # Walk `path` in one go, stopping early in a room with enemies or
+        # where a random encounter comes up. Every room passed through gets
+        # the encounter roll a move would; the last one is left to the next
+        # exploration turn, as after a move. Returns (rooms walked, whether
+        # an encounter stopped the walk); with `report` the walk is
+        # announced and the encounter started.
+        steps = 0
+        encounter = False
+        for direction in path:
+            self.current_room = self.current_room.exits[direction]
+            self.dungeon.mark_visited(self.current_room)
+            steps += 1
+            if self.current_room.enemies:
+                break
+            if steps < len(path) and self.rng.random() < 0.2:
+                encounter = True
+                break
+        if report:
+            x, y = self.current_room.coords
+            self.output(f"You walk {steps} room{'s' if steps != 1 else ''} to ({x},{y}).")
+            if encounter:
+                self._random_encounter()
+            elif steps < len(path):
+                self.output(f"A {self.current_room.enemies[0].name} blocks your way!")
+        return steps, encounter
+
+# Abbreviations accepted by "move"; they and the full names are commands too
+DIRECTION_ABBREVIATIONS = {"n": "north", "s": "south", "e": "east", "w": "west"}
+
+EXPLORATION_COMMANDS = CommandTable()
+EXPLORATION_COMMANDS.register("move", GameEngine._move_command, "move <direction> | move portal",
+                              aliases={**DIRECTION_ABBREVIATIONS,
+                                       **{direction: direction for direction in DIRECTION_ABBREVIATIONS.values()}})
+EXPLORATION_COMMANDS.register("status", GameEngine._status_command)
+EXPLORATION_COMMANDS.register("inventory", GameEngine._inventory_command)
+EXPLORATION_COMMANDS.register("take", GameEngine._take_command, "take <item name>")
+EXPLORATION_COMMANDS.register("attack", GameEngine._attack_command)
+EXPLORATION_COMMANDS.register("goto", GameEngine._goto, "goto <x,y> | goto portal | goto nearest enemy")
+EXPLORATION_COMMANDS.register("explore", GameEngine._explore)
+EXPLORATION_COMMANDS.register("help", GameEngine._help_command)
+
+BATTLE_COMMANDS = CommandTable()
+BATTLE_COMMANDS.register("attack", GameEngine._battle_attack)
+BATTLE_COMMANDS.register("magic", GameEngine._battle_magic)
+BATTLE_COMMANDS.register("item", GameEngine._battle_item)
+BATTLE_COMMANDS.register("flee", GameEngine._battle_flee, aliases={"run": ""})
+
+HUB_COMMANDS = CommandTable()
+HUB_COMMANDS.register("upgrade", GameEngine._hub_upgrade)
+HUB_COMMANDS.register("shop", GameEngine._hub_shop)
+HUB_COMMANDS.register("continue", GameEngine._hub_continue)
+
+UPGRADE_COMMANDS = CommandTable()
+UPGRADE_COMMANDS.register("1", GameEngine._upgrade_attack, aliases={"attack": ""})
+UPGRADE_COMMANDS.register("2", GameEngine._upgrade_max_hp, aliases={"hp": ""})
+UPGRADE_COMMANDS.register("3", GameEngine._upgrade_back, aliases={"back": ""})
 
 if __name__ == "__main__":
     game = GameEngine()
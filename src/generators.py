@@ -0,0 +1,171 @@
+import numpy as np
+
+# One bit per direction in the per-cell exit mask
+DIRECTION_BITS = {"north": 1, "east": 2, "south": 4, "west": 8}
+
+# Every generator below takes (size, rng), rng a numpy Generator, and
+# returns the passages it carved as two boolean arrays:
+#   east[x, y]   (size - 1, size)   (x, y) <-> (x + 1, y)
+#   north[x, y]  (size, size - 1)   (x, y) <-> (x, y + 1)
+# Everything it carves is connected to the start room (0, 0), which the
+# exit room (size - 1, size - 1) always is. Cells it leaves alone are solid
+# rock: no exits, no enemies, no items.
+
+
+def grid(size, rng):
+    # Every cell linked to each neighbour inside the map, the original layout
+    return np.ones((size - 1, size), dtype=bool), np.ones((size, size - 1), dtype=bool)
+
+
+def maze(size, rng, loops=0.05):
+    # Sidewinder spanning tree, then a share `loops` of the remaining walls
+    # knocked through so the maze has cycles. Each row (fixed y) is split
+    # into runs of cells carved east; every run carves north out of one
+    # random member, and the top row is a single run. Each row only depends
+    # on the row above, so the whole grid is carved with array operations.
+    east = rng.random((size - 1, size)) < 0.5
+    east[:, size - 1] = True
+    # Walk the cells row by row (index y * size + x): a run ends where the
+    # next cell isn't carved east, or at the row's end
+    ends = np.ones((size, size), dtype=bool)
+    ends[:, :-1] = ~east.T
+    run_ends = np.flatnonzero(ends)
+    run_starts = np.concatenate(([0], run_ends[:-1] + 1))
+    chosen = run_starts + (rng.random(run_starts.size) * (run_ends - run_starts + 1)).astype(np.int64)
+    y, x = np.divmod(chosen, size)
+    below_top = y < size - 1
+    north = np.zeros((size, size - 1), dtype=bool)
+    north[x[below_top], y[below_top]] = True
+
+    east |= rng.random(east.shape) < loops
+    north |= rng.random(north.shape) < loops
+    return east, north
+
+
+def rooms(size, rng, cells_per_room=50, min_side=3, max_side=8):
+    # Rectangular rooms scattered over the map (overlapping ones merge),
+    # chained by L-shaped corridors. The first room covers the start, the
+    # last the exit, and the ones between are visited in bands so that
+    # corridors stay short.
+    count = max(2, size * size // cells_per_room)
+    width = np.minimum(rng.integers(min_side, max_side + 1, count), size)
+    height = np.minimum(rng.integers(min_side, max_side + 1, count), size)
+    left = rng.integers(0, size - width + 1)
+    bottom = rng.integers(0, size - height + 1)
+    left[0] = bottom[0] = 0
+    left[-1], bottom[-1] = size - width[-1], size - height[-1]
+
+    # Paint the rectangles with a 2-D difference array
+    paint = np.zeros((size + 1, size + 1), dtype=np.int32)
+    np.add.at(paint, (left, bottom), 1)
+    np.add.at(paint, (left + width, bottom), -1)
+    np.add.at(paint, (left, bottom + height), -1)
+    np.add.at(paint, (left + width, bottom + height), 1)
+    floor = paint.cumsum(axis=0).cumsum(axis=1)[:size, :size] > 0
+    east = floor[:-1, :] & floor[1:, :]
+    north = floor[:, :-1] & floor[:, 1:]
+
+    centre_x = left + width // 2
+    centre_y = bottom + height // 2
+    band = centre_y[1:-1] // max_side
+    key = band * size + np.where(band % 2 == 0, centre_x[1:-1], size - 1 - centre_x[1:-1])
+    order = np.concatenate(([0], 1 + np.argsort(key, kind="stable"), [count - 1]))
+    from_x, from_y = centre_x[order[:-1]], centre_y[order[:-1]]
+    to_x, to_y = centre_x[order[1:]], centre_y[order[1:]]
+    # East along from_y to to_x, then north or south along to_x to to_y
+    corridor = np.zeros((size, size), dtype=np.int32)
+    np.add.at(corridor, (np.minimum(from_x, to_x), from_y), 1)
+    np.add.at(corridor, (np.maximum(from_x, to_x), from_y), -1)
+    east |= corridor.cumsum(axis=0)[:-1, :] > 0
+    corridor[:] = 0
+    np.add.at(corridor, (to_x, np.minimum(from_y, to_y)), 1)
+    np.add.at(corridor, (to_x, np.maximum(from_y, to_y)), -1)
+    north |= corridor.cumsum(axis=1)[:, :-1] > 0
+    return east, north
+
+
+def caves(size, rng, fill=0.45, smoothing=4):
+    # Cellular automaton caves: random rock smoothed a few times (rock stays
+    # with 4+ rock neighbours, floor turns to rock with 5+; the border counts
+    # as rock). A random staircase from the start to the exit is dug out
+    # first so they are always joined, and pockets the start can't reach are
+    # filled back in.
+    rock = rng.random((size, size)) < fill
+    for _ in range(smoothing):
+        padded = np.pad(rock, 1, constant_values=True).astype(np.int8)
+        neighbours = sum(padded[1 + dx:size + 1 + dx, 1 + dy:size + 1 + dy]
+                         for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy)
+        rock = np.where(rock, neighbours >= 4, neighbours >= 5)
+
+    steps = np.zeros(2 * (size - 1), dtype=np.int64)
+    steps[rng.permutation(steps.size)[:size - 1]] = 1  # 1: east, 0: north
+    path_x = np.concatenate(([0], np.cumsum(steps)))
+    path_y = np.concatenate(([0], np.cumsum(1 - steps)))
+    rock[path_x, path_y] = False
+
+    floor = ~rock
+    east = floor[:-1, :] & floor[1:, :]
+    north = floor[:, :-1] & floor[:, 1:]
+    reached = reachable(exit_masks(east, north), size).reshape(size, size)
+    return east & reached[:-1, :], north & reached[:, :-1]
+
+
+GENERATORS = {"grid": grid, "maze": maze, "rooms": rooms, "caves": caves}
+
+
+def exit_masks(east, north):
+    # Per-cell exit bitmasks (index x * size + y) of a generator's passages
+    size = north.shape[0]
+    masks = np.zeros((size, size), dtype=np.uint8)
+    masks[:, :-1] |= north * np.uint8(DIRECTION_BITS["north"])
+    masks[:, 1:] |= north * np.uint8(DIRECTION_BITS["south"])
+    masks[:-1, :] |= east * np.uint8(DIRECTION_BITS["east"])
+    masks[1:, :] |= east * np.uint8(DIRECTION_BITS["west"])
+    return masks.ravel()
+
+
+def generate_exits(generator, size, rng):
+    # Exit bitmasks of a `generator` layout, by name
+    carve = GENERATORS.get(generator)
+    if carve is None:
+        raise ValueError(f"unknown dungeon generator {generator!r}; choose from {', '.join(GENERATORS)}")
+    return exit_masks(*carve(size, rng))
+
+
+def reachable(masks, size, start=0):
+    # Cells connected to cell `start` through the exit bitmasks, searched a
+    # level at a time
+    offsets = {"north": 1, "east": size, "south": -1, "west": -size}
+    seen = np.zeros(size * size, dtype=bool)
+    seen[start] = True
+    frontier = np.array([start], dtype=np.int64)
+    while frontier.size:
+        frontier_masks = masks[frontier]
+        reached = []
+        for direction, bit in DIRECTION_BITS.items():
+            targets = frontier[(frontier_masks & bit) != 0] + offsets[direction]
+            targets = targets[~seen[targets]]
+            seen[targets] = True
+            reached.append(targets)
+        frontier = np.concatenate(reached)
+    return seen
+
+
+def place_contents(rng, cells, start, stage_level, enemy_kinds, item_kinds, floor=None):
+    # One batch of draws for a stage's wandering enemies and stock items:
+    # returns (enemy kind per cell, -1 for none; item code per cell, 1 to
+    # item_kinds, 0 for none). Nothing goes in the start room or, given a
+    # `floor` mask, in rock.
+    enemy_kind = np.full(cells, -1, dtype=np.int8)
+    items = np.zeros(cells, dtype=np.uint8)
+    has_enemy = rng.random(cells) < 0.3 + (stage_level * 0.05)
+    has_enemy[start] = False
+    kinds = rng.integers(0, enemy_kinds, cells, dtype=np.int8)
+    has_item = rng.random(cells) < 0.2
+    has_item[start] = False
+    if floor is not None:
+        has_enemy &= floor
+        has_item &= floor
+    enemy_kind[has_enemy] = kinds[has_enemy]
+    items[has_item] = rng.integers(1, item_kinds + 1, cells, dtype=np.uint8)[has_item]
+    return enemy_kind, items
@@ -0,0 +1,96 @@
+class Inventory:
+    # Counted multiset of item names, used for the player's inventory and
+    # the items lying in a room. Items are keyed by their case-folded name,
+    # folded once when they are added, so adding, removing and counting are
+    # dict operations however many items there are. An item keeps the
+    # spelling it was first added with. Iterating yields every item, copies
+    # included, in the order their names were first added.
+    __slots__ = ("_stacks", "_size", "_summary")
+
+    def __init__(self, items=()):
+        self._stacks = {}  # {key: (name as first added, quantity)}
+        self._size = 0
+        self._summary = None  # Rendered summary(), dropped on every change
+        for item in items:
+            self.add(item)
+
+    def add(self, item, quantity=1):
+        key = item.casefold()
+        stack = self._stacks.get(key)
+        self._stacks[key] = (item, quantity) if stack is None else (stack[0], stack[1] + quantity)
+        self._size += quantity
+        self._summary = None
+
+    def remove(self, item, quantity=1):
+        # Take `quantity` of `item` (any case) out and return its stored
+        # name, or None, leaving everything as it was, if there aren't enough
+        key = item.casefold()
+        stack = self._stacks.get(key)
+        if stack is None or stack[1] < quantity or quantity <= 0:
+            return None
+        name, count = stack
+        if count == quantity:
+            del self._stacks[key]
+        else:
+            self._stacks[key] = (name, count - quantity)
+        self._size -= quantity
+        self._summary = None
+        return name
+
+    def count(self, item):
+        stack = self._stacks.get(item.casefold())
+        return stack[1] if stack is not None else 0
+
+    def stacks(self):
+        # [(name, quantity), ...] in the order the names were first added
+        return list(self._stacks.values())
+
+    def update(self, other):
+        for name, count in other.stacks():
+            self.add(name, count)
+
+    def copy(self):
+        copy = Inventory()
+        copy._stacks = dict(self._stacks)
+        copy._size = self._size
+        copy._summary = self._summary
+        return copy
+
+    def summary(self):
+        # "Health Potion x3, Rusty Sword", or "" when empty
+        if self._summary is None:
+            self._summary = ", ".join(name if count == 1 else f"{name} x{count}"
+                                      for name, count in self.stacks())
+        return self._summary
+
+    def __contains__(self, item):
+        return item.casefold() in self._stacks
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for name, count in self.stacks():
+            for _ in range(count):
+                yield name
+
+    def __eq__(self, other):
+        if not isinstance(other, Inventory):
+            return NotImplemented
+        return ({key: count for key, (_, count) in self._stacks.items()}
+                == {key: count for key, (_, count) in other._stacks.items()})
+
+    def __repr__(self):
+        return f"Inventory({self.stacks()!r})"
+
+
+class _EmptyInventory(Inventory):
+    # The items of every room that has none: one shared instance, so it
+    # refuses to hold anything. Room.add_item gives the room its own.
+    __slots__ = ()
+
+    def add(self, item, quantity=1):
+        raise TypeError("the shared empty inventory can't hold items")
+
+
+EMPTY_INVENTORY = _EmptyInventory()
@@ -0,0 +1,292 @@
+import random
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from itertools import compress, repeat
+
+from game import BOSS_ENEMY, DUNGEON_ITEMS, ENEMY_REGISTRY, WANDERING_ENEMIES, Dungeon, Room, room_description
+
+# Placement codes stored per cell of a column; 0 means "nothing here".
+# Enemy codes are 1-based indexes into WANDERING_ENEMIES, item codes into
+# DUNGEON_ITEMS.
+ITEM_CODES = [None] + DUNGEON_ITEMS
+
+# bytes.translate() tables between a column's codes and the binary digits
+# of its enemy bitset: code -> b"0"/b"1", and digit -> 0/1
+_CODE_DIGITS = b"0" + b"1" * 255
+_DIGIT_FLAGS = bytes(49) + b"\x01" + bytes(206)
+
+
+class LazyExits(MutableMapping):
+    # Room.exits for lazy rooms: holds neighbour coordinates and resolves them
+    # through the dungeon, so a room never pins its neighbours in memory
+    def __init__(self, dungeon, exit_coords):
+        self.dungeon = dungeon
+        self.exit_coords = exit_coords  # {direction: (x, y)}
+
+    def __getitem__(self, direction):
+        return self.dungeon.get_room(self.exit_coords[direction])
+
+    def __setitem__(self, direction, room):
+        self.exit_coords[direction] = room.coords
+
+    def __delitem__(self, direction):
+        del self.exit_coords[direction]
+
+    def __iter__(self):
+        return iter(self.exit_coords)
+
+    def __len__(self):
+        return len(self.exit_coords)
+
+
+class LazyRooms(Mapping):
+    # Dungeon.rooms for lazy dungeons. Lookups materialize rooms on demand;
+    # iterating over values() builds every room, so avoid it on big maps.
+    def __init__(self, dungeon):
+        self.dungeon = dungeon
+
+    def __getitem__(self, coords):
+        room = self.dungeon.get_room(coords)
+        if room is None:
+            raise KeyError(coords)
+        return room
+
+    def __contains__(self, coords):
+        return self.dungeon._in_bounds(coords)
+
+    def __iter__(self):
+        for x in range(self.dungeon.size):
+            for y in range(self.dungeon.size):
+                yield (x, y)
+
+    def __len__(self):
+        return self.dungeon.size * self.dungeon.size
+
+
+class LazyDungeon(Dungeon):
+    # Same rules as Dungeon, but rooms are derived from (seed, coords) when
+    # first looked up instead of all being built up front. Materialized rooms
+    # live in a bounded LRU cache; rooms the player changed (enemies killed or
+    # hurt, items taken) are remembered as small (enemies, items) deltas so
+    # they come back the same way after eviction.
+    def __init__(self, size=5, stage_level=1, is_boss_stage=False, seed=None, rng=None, cache_size=4096,
+                 column_cache_size=256, generator="grid"):
+        if generator != "grid":
+            # Rooms are derived one column at a time, which only the grid allows
+            raise ValueError("lazy dungeons only generate the grid layout")
+        if seed is None:
+            # Rooms are addressed by an integer seed, so draw one from `rng`
+            seed = (rng or random).getrandbits(64)
+        self.cache_size = cache_size
+        self.column_cache_size = column_cache_size
+        self._rooms = OrderedDict()  # LRU of materialized rooms
+        self._columns = OrderedDict()  # LRU of per-column placement codes
+        self._deltas = {}  # {(x, y): (enemies, items)} for modified rooms
+        super().__init__(size, stage_level, is_boss_stage, seed=seed)
+
+    def _init_enemy_index(self):
+        # Counts are kept as pristine totals (computed on first use, since
+        # that needs every column) plus the changes made since generation
+        self._pristine_counts = None
+        self._enemy_bits = None  # [int] bit y set where column x generated an enemy
+        self._enemy_delta = 0
+        self._enemy_room_delta = 0
+
+    def _generate_dungeon(self):
+        self.rooms = LazyRooms(self)
+
+    def _in_bounds(self, coords):
+        x, y = coords
+        return 0 <= x < self.size and 0 <= y < self.size
+
+    def _column(self, x):
+        column = self._columns.get(x)
+        if column is not None:
+            self._columns.move_to_end(x)
+            return column
+
+        column = self._generate_column(x)
+        self._columns[x] = column
+        if len(self._columns) > self.column_cache_size:
+            self._columns.popitem(last=False)
+        return column
+
+    def _generate_column(self, x):
+        # One RNG stream per column keeps any single room cheap to re-derive
+        rng = random.Random(f"{self.seed}:{self.stage_level}:{x}")
+        enemies = bytearray(self.size)
+        items = bytearray(self.size)
+        if self.is_boss_stage:
+            return enemies, items  # Only the boss, which is placed separately
+
+        enemy_chance = 0.3 + (self.stage_level * 0.05)
+        # choice() over the codes draws exactly what randint(1, n) would
+        random_, choice = rng.random, rng.choice
+        enemy_kinds, item_kinds = range(1, len(WANDERING_ENEMIES) + 1), range(1, len(ITEM_CODES))
+        start_x, start_y = self.start_room_coords
+        for y in range(self.size):
+            if x == start_x and y == start_y:
+                continue
+            if random_() < enemy_chance:
+                enemies[y] = choice(enemy_kinds)
+            if random_() < 0.2:
+                items[y] = choice(item_kinds)
+        return enemies, items
+
+    def _exit_coords(self, coords):
+        x, y = coords
+        exits = {}
+        # Same exit order as the eager grid: west, south, north, east
+        if x > 0:
+            exits["west"] = (x - 1, y)
+        if y > 0:
+            exits["south"] = (x, y - 1)
+        if y < self.size - 1:
+            exits["north"] = (x, y + 1)
+        if x < self.size - 1:
+            exits["east"] = (x + 1, y)
+        return exits
+
+    def _derive_room(self, coords):
+        x, y = coords
+        room = Room(room_description(coords) + self._description_suffix(coords),
+                    exits=LazyExits(self, self._exit_coords(coords)), coords=coords)
+
+        delta = self._deltas.get(coords)
+        if delta is not None:
+            # Share the lists so every copy of this room sees the same state
+            room.enemies, room.items = delta
+        elif self.is_boss_stage:
+            if coords == self.exit_coords:
+                room.enemies.append(ENEMY_REGISTRY.spawn(BOSS_ENEMY, self.stage_level, is_boss=True))
+        else:
+            enemy_codes, item_codes = self._column(x)
+            if enemy_codes[y]:
+                enemy_type = WANDERING_ENEMIES[enemy_codes[y] - 1]
+                room.enemies.append(ENEMY_REGISTRY.spawn(enemy_type, self.stage_level))
+            if item_codes[y]:
+                room.add_item(ITEM_CODES[item_codes[y]])  # No dungeon hooks yet, it isn't attached
+
+        room.dungeon = self
+        return room
+
+    def get_room(self, coords):
+        room = self._rooms.get(coords)
+        if room is not None:
+            self._rooms.move_to_end(coords)
+            return room
+        if not self._in_bounds(coords):
+            return None
+
+        room = self._derive_room(coords)
+        self._rooms[coords] = room
+        if len(self._rooms) > self.cache_size:
+            self._evict(*self._rooms.popitem(last=False))
+        return room
+
+    def _evict(self, coords, room):
+        # Enemies that were hurt but not killed never went through a Room
+        # method, so catch them here before the room is dropped
+        if coords not in self._deltas and any(enemy.hp < enemy.max_hp for enemy in room.enemies):
+            self._record_delta(room)
+
+    def _record_delta(self, room):
+        self._deltas[room.coords] = (room.enemies, room.items)
+        # A copy still held after eviction (e.g. the engine's current_room)
+        # changed while a fresh copy sits in the cache: make the cached copy
+        # share the recorded lists, or it would keep the enemies and items
+        # the held copy just lost
+        cached = self._rooms.get(room.coords)
+        if cached is not None and cached is not room:
+            cached.enemies, cached.items = room.enemies, room.items
+            cached.invalidate_description()
+
+    def _enemy_added(self, room):
+        self._record_delta(room)
+        self._enemy_delta += 1
+        if len(room.enemies) == 1:
+            self._enemy_room_delta += 1
+
+    def _enemy_removed(self, room):
+        self._record_delta(room)
+        self._enemy_delta -= 1
+        if not room.enemies:
+            self._enemy_room_delta -= 1
+
+    def _items_changed(self, room):
+        self._record_delta(room)
+
+    def mark_visited(self, room):
+        room.visited = True  # Forgotten with the room once it is evicted
+
+    def _pristine_column(self, x):
+        # Column x as generated, without reshuffling the column cache
+        return self._columns.get(x) or self._generate_column(x)
+
+    def _pristine_enemy_bits(self):
+        # Every column is derived once, the first time a whole-map answer is
+        # needed, and only its enemy bitset kept; a map larger than the
+        # column cache would otherwise be regenerated on each call
+        if self._enemy_bits is None:
+            self._enemy_bits = [int(self._pristine_column(x)[0].translate(_CODE_DIGITS)[::-1], 2)
+                                for x in range(self.size)]
+        return self._enemy_bits
+
+    def _count_pristine_enemies(self):
+        if self._pristine_counts is None:
+            if self.is_boss_stage:
+                self._pristine_counts = (1, 1)
+            else:
+                enemies = sum(bits.bit_count() for bits in self._pristine_enemy_bits())
+                self._pristine_counts = (enemies, enemies)  # At most one enemy per room
+        return self._pristine_counts
+
+    @property
+    def enemy_count(self):
+        return self._count_pristine_enemies()[0] + self._enemy_delta
+
+    def is_cleared(self):
+        if self._pristine_counts is None and self._enemy_bits is None and not self.is_boss_stage:
+            # Short of the totals, which take the whole map, a generated
+            # enemy nobody has touched settles it, and nearly always turns up
+            # in the first column looked at
+            if any(enemies for enemies, _ in self._deltas.values()):
+                return False
+            rows = range(self.size)
+            for x in [*self._columns, *(x for x in rows if x not in self._columns)]:
+                enemy_codes = self._pristine_column(x)[0]
+                if any((x, y) not in self._deltas for y in compress(rows, enemy_codes)):
+                    return False
+        return self.enemy_count == 0
+
+    def rooms_with_enemies_remaining(self):
+        return self._count_pristine_enemies()[1] + self._enemy_room_delta
+
+    def enemy_coords(self):
+        if self.is_boss_stage:
+            columns = {x: 0 for x in range(self.size)}
+            boss_x, boss_y = self.exit_coords
+            columns[boss_x] = 1 << boss_y
+        else:
+            columns = dict(enumerate(self._pristine_enemy_bits()))
+        for (x, y), (enemies, _) in self._deltas.items():
+            if enemies:
+                columns[x] |= 1 << y
+            else:
+                columns[x] &= ~(1 << y)
+
+        occupied = []
+        rows = range(self.size)
+        for x, bits in columns.items():
+            if bits:
+                flags = format(bits, f"0{self.size}b")[::-1].encode().translate(_DIGIT_FLAGS)
+                occupied.extend(zip(repeat(x), compress(rows, flags)))
+        return occupied
+
+    def neighbours(self, coords):
+        # Cached rooms answer from their own exits; others from the grid
+        # rule, so path searches don't churn the room cache
+        room = self._rooms.get(coords)
+        if room is not None:
+            return list(room.exits.exit_coords.items())
+        return list(self._exit_coords(coords).items())
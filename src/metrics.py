@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from events import BattleStarted, DamageResolved, LevelUp, RandomEncounter, StageChanged
+from game import Player
+
+# Upper bounds (seconds) of the turn latency histogram buckets
+TURN_SECONDS_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 1e-2, 1e-1)
+
+
+class GameMetrics:
+    # Aggregated timers and counters for one or more GameEngines: turn counts
+    # and latency histograms per GameState, plus game counters fed by the
+    # engines' event buses. Everything is plain data, so instances pickle and
+    # can be merged across processes.
+    def __init__(self):
+        self.turns = {}  # {state name: [bucket counts..., +Inf count]}
+        self.turn_seconds = {}  # {state name: total seconds}
+        self.battles = {}  # {stage: battles started}
+        self.counters = {"random_encounters": 0, "level_ups": 0, "stage_changes": 0,
+                         "damage_taken": 0, "damage_dealt": 0}
+
+    def attach(self, engine):
+        # Time `engine`'s turns and count its events from now on
+        engine.metrics = self
+        engine.events.subscribe(DamageResolved, self._on_damage)
+        engine.events.subscribe(LevelUp, self._on_level_up)
+        engine.events.subscribe(StageChanged, self._on_stage_changed)
+        engine.events.subscribe(RandomEncounter, self._on_random_encounter)
+        engine.events.subscribe(BattleStarted, self._on_battle_started)
+        return engine
+
+    def _on_damage(self, event):
+        if isinstance(event.target, Player):
+            self.counters["damage_taken"] += event.amount
+        else:
+            self.counters["damage_dealt"] += event.amount
+
+    def _on_level_up(self, event):
+        self.counters["level_ups"] += 1
+
+    def _on_stage_changed(self, event):
+        self.counters["stage_changes"] += 1
+
+    def _on_random_encounter(self, event):
+        self.counters["random_encounters"] += 1
+
+    def _on_battle_started(self, event):
+        self.battles[event.stage] = self.battles.get(event.stage, 0) + 1
+
+    def timed_turn(self, engine, turn):
+        # Relay `turn`'s prompts while adding up the time spent between them,
+        # so waiting for the player isn't counted
+        state = engine.game_state.name
+        elapsed = 0.0
+        start = time.perf_counter()
+        try:
+            prompt = next(turn)
+            while True:
+                elapsed += time.perf_counter() - start
+                command = yield prompt
+                start = time.perf_counter()
+                prompt = turn.send(command)
+        except StopIteration:
+            elapsed += time.perf_counter() - start
+        self.record_turn(state, elapsed)
+
+    def record_turn(self, state, seconds):
+        buckets = self.turns.get(state)
+        if buckets is None:
+            buckets = self.turns[state] = [0] * (len(TURN_SECONDS_BUCKETS) + 1)
+            self.turn_seconds[state] = 0.0
+        for index, bound in enumerate(TURN_SECONDS_BUCKETS):
+            if seconds <= bound:
+                break
+        else:
+            index = len(TURN_SECONDS_BUCKETS)
+        buckets[index] += 1
+        self.turn_seconds[state] += seconds
+
+    def merge(self, other):
+        for state, buckets in other.turns.items():
+            mine = self.turns.setdefault(state, [0] * len(buckets))
+            for index, count in enumerate(buckets):
+                mine[index] += count
+            self.turn_seconds[state] = self.turn_seconds.get(state, 0.0) + other.turn_seconds[state]
+        for stage, count in other.battles.items():
+            self.battles[stage] = self.battles.get(stage, 0) + count
+        for name, value in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        return self
+
+    def as_dict(self):
+        return {
+            "turns": {state: {"count": sum(buckets), "seconds": self.turn_seconds[state],
+                              "buckets": dict(zip([*map(str, TURN_SECONDS_BUCKETS), "+Inf"], buckets))}
+                      for state, buckets in self.turns.items()},
+            "battles_per_stage": {str(stage): count for stage, count in sorted(self.battles.items())},
+            "counters": dict(self.counters),
+        }
+
+    def to_prometheus(self):
+        # Prometheus text exposition format
+        lines = ["# HELP dungeon_turn_seconds Engine time per turn, by game state.",
+                 "# TYPE dungeon_turn_seconds histogram"]
+        for state, buckets in list(self.turns.items()):
+            cumulative = 0
+            for bound, count in zip([*map(repr, TURN_SECONDS_BUCKETS), "+Inf"], buckets):
+                cumulative += count
+                lines.append(f'dungeon_turn_seconds_bucket{{state="{state}",le="{bound}"}} {cumulative}')
+            lines.append(f'dungeon_turn_seconds_sum{{state="{state}"}} {self.turn_seconds[state]!r}')
+            lines.append(f'dungeon_turn_seconds_count{{state="{state}"}} {cumulative}')
+
+        lines += ["# HELP dungeon_battles_total Battles started, by stage.",
+                  "# TYPE dungeon_battles_total counter"]
+        for stage, count in sorted(self.battles.items()):
+            lines.append(f'dungeon_battles_total{{stage="{stage}"}} {count}')
+
+        for name, value in list(self.counters.items()):
+            lines.append(f"# TYPE dungeon_{name}_total counter")
+            lines.append(f"dungeon_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # JSON for *.json paths, Prometheus text (e.g. for a textfile
+        # collector) otherwise; replaced atomically
+        text = json.dumps(self.as_dict(), indent=2) if path.endswith(".json") else self.to_prometheus()
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as output:
+            output.write(text)
+        os.replace(temp_path, path)
+
+
+def serve_metrics(metrics, host="127.0.0.1", port=9108):
+    # Serve metrics.to_prometheus() at http://host:port/metrics from a
+    # background thread. Returns the server; call shutdown() to stop it.
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes would otherwise log to stderr every few seconds
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,231 @@
+import heapq
+from array import array
+from collections import deque
+
+UNREACHABLE = -1
+
+
+class DistanceField:
+    # Steps from every room to the nearest of a set of target rooms, plus
+    # which target that is. Cells are indexed x * size + y; UNREACHABLE
+    # marks rooms with no path to any target. Doors are two-way in every
+    # layout we generate, so a search outward from the targets gives the
+    # distance *to* them.
+    def __init__(self, index, targets):
+        self.index = index
+        self.targets = {index.cell(target) for target in targets}
+        breadth_first = getattr(index.dungeon, "breadth_first", None)
+        if breadth_first is not None:
+            # The backend can search its own storage in bulk (ArrayDungeon)
+            distance, owner = breadth_first(sorted(self.targets))
+            self.distance = array("i", distance.astype("<i4").tobytes())
+            self.owner = array("i", owner.astype("<i4").tobytes())
+        else:
+            self._breadth_first()
+
+    def _breadth_first(self):
+        cells = self.index.size * self.index.size
+        distance = self.distance = array("i", [UNREACHABLE]) * cells
+        owner = self.owner = array("i", [UNREACHABLE]) * cells
+        queue = deque(self.targets)
+        for cell in queue:
+            distance[cell] = 0
+            owner[cell] = cell
+        while queue:
+            cell = queue.popleft()
+            steps = distance[cell] + 1
+            for neighbour in self.index.neighbour_cells(cell):
+                if distance[neighbour] == UNREACHABLE:
+                    distance[neighbour] = steps
+                    owner[neighbour] = owner[cell]
+                    queue.append(neighbour)
+
+    def add_target(self, coords):
+        # A new target can only bring rooms closer: spread out from it while
+        # it beats the distance already recorded
+        cell = self.index.cell(coords)
+        if cell in self.targets:
+            return
+        self.targets.add(cell)
+        self.distance[cell] = 0
+        self.owner[cell] = cell
+        self._spread([(0, cell, cell)])
+
+    def remove_target(self, coords):
+        # Only rooms whose nearest target was this one are affected: forget
+        # their distances, then refill them from the unaffected rooms around
+        cell = self.index.cell(coords)
+        if cell not in self.targets:
+            return
+        self.targets.discard(cell)
+        distance, owner = self.distance, self.owner
+
+        affected = [cell]
+        owner[cell] = UNREACHABLE
+        distance[cell] = UNREACHABLE
+        queue = deque(affected)
+        while queue:
+            for neighbour in self.index.neighbour_cells(queue.popleft()):
+                if owner[neighbour] == cell:
+                    owner[neighbour] = UNREACHABLE
+                    distance[neighbour] = UNREACHABLE
+                    affected.append(neighbour)
+                    queue.append(neighbour)
+
+        frontier = []
+        for affected_cell in affected:
+            for neighbour in self.index.neighbour_cells(affected_cell):
+                if distance[neighbour] != UNREACHABLE:
+                    frontier.append((distance[neighbour] + 1, affected_cell, owner[neighbour]))
+        self._spread(frontier)
+
+    def _spread(self, frontier):
+        # Unit-weight Dijkstra from (distance, cell, owner) entries; entries
+        # with a distance of 0 are targets that are already recorded
+        distance, owner = self.distance, self.owner
+        heapq.heapify(frontier)
+        while frontier:
+            steps, cell, source = heapq.heappop(frontier)
+            current = distance[cell]
+            if steps > 0:
+                if current != UNREACHABLE and current <= steps:
+                    continue
+                distance[cell] = steps
+                owner[cell] = source
+            elif current != 0 or owner[cell] != source:
+                continue
+            for neighbour in self.index.neighbour_cells(cell):
+                known = distance[neighbour]
+                if known == UNREACHABLE or known > steps + 1:
+                    heapq.heappush(frontier, (steps + 1, neighbour, source))
+
+    def steps_from(self, coords):
+        return self.distance[self.index.cell(coords)]
+
+    def path_from(self, coords):
+        # Directions leading downhill from coords to the nearest target, or
+        # None if there is no way there
+        steps = self.steps_from(coords)
+        if steps == UNREACHABLE:
+            return None
+        path = []
+        while steps > 0:
+            for direction, neighbour in self.index.dungeon.neighbours(coords):
+                if self.distance[self.index.cell(neighbour)] == steps - 1:
+                    path.append(direction)
+                    coords = neighbour
+                    break
+            steps -= 1
+        return path
+
+
+class NavigationIndex:
+    # Path finding over a dungeon's room graph. The distance field to the
+    # exit is built once per dungeon, for callers that consult it every
+    # turn; the one to the nearest enemy is kept up to date through
+    # Dungeon._enemies_changed as fights are won, rather than being rebuilt.
+    # Point-to-point routes use A*.
+    def __init__(self, dungeon):
+        self.dungeon = dungeon
+        self.size = dungeon.size
+        self._exit_field = None
+        self._enemy_field = None
+
+    @classmethod
+    def of(cls, dungeon):
+        # The dungeon's index, creating it on first use
+        if dungeon.navigation is None:
+            dungeon.navigation = cls(dungeon)
+        return dungeon.navigation
+
+    def cell(self, coords):
+        return coords[0] * self.size + coords[1]
+
+    def coords(self, cell):
+        return divmod(cell, self.size)
+
+    def neighbour_cells(self, cell):
+        return [self.cell(neighbour) for _, neighbour in self.dungeon.neighbours(self.coords(cell))]
+
+    def in_bounds(self, coords):
+        x, y = coords
+        return 0 <= x < self.size and 0 <= y < self.size
+
+    @property
+    def exit_field(self):
+        if self._exit_field is None:
+            self._exit_field = DistanceField(self, [self.dungeon.exit_coords])
+        return self._exit_field
+
+    @property
+    def enemy_field(self):
+        if self._enemy_field is None:
+            self._enemy_field = DistanceField(self, self.dungeon.enemy_coords())
+        return self._enemy_field
+
+    def enemies_changed(self, coords, occupied):
+        if self._enemy_field is None:
+            return  # Built from scratch when first needed
+        if occupied:
+            self._enemy_field.add_target(coords)
+        else:
+            self._enemy_field.remove_target(coords)
+
+    def path_to_exit(self, start):
+        # A single route is far cheaper by A* than a field over the whole
+        # map, unless the field is built already or the backend builds it
+        # in bulk
+        if self._exit_field is None and getattr(self.dungeon, "breadth_first", None) is None:
+            return self.path(start, self.dungeon.exit_coords)
+        return self.exit_field.path_from(start)
+
+    def path_to_nearest_enemy(self, start):
+        return self.enemy_field.path_from(start)
+
+    def path(self, start, goal):
+        # A* with the Manhattan distance, which never overestimates when
+        # every exit leads to an adjacent room
+        if not self.in_bounds(goal):
+            return None
+        heuristic = lambda coords: abs(coords[0] - goal[0]) + abs(coords[1] - goal[1])
+        came_from = {start: None}
+        cost = {start: 0}
+        # Ties on the estimate go to the deepest entry, which keeps open grids
+        # from being flooded breadth-first
+        frontier = [(heuristic(start), 0, start)]
+        while frontier:
+            _, steps, coords = heapq.heappop(frontier)
+            steps = -steps
+            if coords == goal:
+                return self._walk_back(came_from, goal)
+            if steps > cost[coords]:
+                continue
+            for direction, neighbour in self.dungeon.neighbours(coords):
+                if neighbour not in cost or steps + 1 < cost[neighbour]:
+                    cost[neighbour] = steps + 1
+                    came_from[neighbour] = (coords, direction)
+                    heapq.heappush(frontier, (steps + 1 + heuristic(neighbour), -(steps + 1), neighbour))
+        return None
+
+    def path_to_nearest(self, start, wanted):
+        # Breadth-first search for the closest room whose coords satisfy
+        # `wanted`; returns its directions, or None if there is none
+        came_from = {start: None}
+        queue = deque([start])
+        while queue:
+            coords = queue.popleft()
+            if coords != start and wanted(coords):
+                return self._walk_back(came_from, coords)
+            for direction, neighbour in self.dungeon.neighbours(coords):
+                if neighbour not in came_from:
+                    came_from[neighbour] = (coords, direction)
+                    queue.append(neighbour)
+        return None
+
+    def _walk_back(self, came_from, coords):
+        path = []
+        while came_from[coords] is not None:
+            coords, direction = came_from[coords]
+            path.append(direction)
+        path.reverse()
+        return path
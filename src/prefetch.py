@@ -0,0 +1,48 @@
+import threading
+
+
+class StagePrefetch:
+    # Runs `build` (a no-argument callable returning a dungeon) on a
+    # background thread, e.g. while the player sits in the hub. take() hands
+    # the result over exactly once: whichever side claims the job first
+    # builds it, so the worker and the player never both generate a stage.
+    # Everything random about the build must already be fixed in `build`
+    # (its seed), so the same dungeon comes out on either side.
+    def __init__(self, build):
+        self._build = build
+        self._lock = threading.Lock()
+        self._claimed = False
+        self._finished = threading.Event()
+        self._dungeon = None
+        self._error = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        with self._lock:
+            if self._claimed:
+                return  # take() got here first and built it itself
+            self._claimed = True
+        try:
+            self._dungeon = self._build()
+        except Exception as error:
+            self._error = error  # Retried by take(), which lets it propagate there
+        finally:
+            self._finished.set()
+
+    @property
+    def ready(self):
+        return self._finished.is_set()
+
+    def take(self):
+        with self._lock:
+            started = self._claimed
+            self._claimed = True
+        if not started:
+            # The worker never got going: build it here instead
+            return self._build()
+        # A stage that is half-built is waited for, not rebuilt, since a
+        # second build would only compete with the worker for the GIL
+        self._finished.wait()
+        if self._error is not None:
+            return self._build()
+        return self._dungeon
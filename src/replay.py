@@ -0,0 +1,142 @@
+import argparse
+import functools
+import gzip
+import time
+from collections import namedtuple
+
+from array_dungeon import ArrayDungeon
+from game import Dungeon, GameEngine
+from generators import GENERATORS
+from lazy_dungeon import LazyDungeon
+from simulation import ScriptedPolicy, run_headless
+
+# A session log is a header line
+#   dungeon-session <version> <seed> <backend> <size> <generator>
+# followed by every command the player typed, one per line. The header holds
+# everything needed to rebuild the same game; version 1 logs only had the
+# seed, and are replayed with whatever dungeon factory the caller passes.
+# Paths ending in .gz are gzip-compressed.
+LOG_HEADER = "dungeon-session"
+LOG_VERSION = 2
+DUNGEON_BACKENDS = {"objects": Dungeon, "lazy": LazyDungeon, "arrays": ArrayDungeon}
+
+# What a log records about the game it was played on
+SessionSettings = namedtuple("SessionSettings", ["seed", "backend", "size", "generator"])
+
+
+def session_factory(settings):
+    # The dungeon factory the session was played with
+    return functools.partial(DUNGEON_BACKENDS[settings.backend], size=settings.size,
+                             generator=settings.generator)
+
+
+class SessionRecorder:
+    # Stands in for input(), remembering every command it hands back
+    def __init__(self, input_func=input):
+        self.input_func = input_func
+        self.commands = []
+
+    def __call__(self, prompt):
+        command = self.input_func(prompt)
+        self.commands.append(command)
+        return command
+
+
+def _open_log(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def save_session(path, settings, commands):
+    if settings.seed is None:
+        # An engine built from an rng= has no seed to replay from
+        raise ValueError("only sessions of seeded engines can be recorded")
+    if settings.backend not in DUNGEON_BACKENDS:
+        raise ValueError(f"unknown dungeon backend {settings.backend!r}")
+    with _open_log(path, "w") as log:
+        log.write(f"{LOG_HEADER} {LOG_VERSION} {settings.seed} {settings.backend} {settings.size} "
+                  f"{settings.generator}\n")
+        for command in commands:
+            log.write(command.replace("\n", " ") + "\n")
+
+
+def load_session(path):
+    # Returns (SessionSettings, commands); a version 1 log only knows its seed
+    with _open_log(path, "r") as log:
+        header = log.readline().split()
+        if len(header) < 3 or header[0] != LOG_HEADER:
+            raise ValueError(f"{path} is not a session log")
+        version = int(header[1])
+        if version == 1 and len(header) == 3:
+            settings = SessionSettings(int(header[2]), None, None, None)
+        elif version == LOG_VERSION and len(header) == 6:
+            settings = SessionSettings(int(header[2]), header[3], int(header[4]), header[5])
+            if settings.backend not in DUNGEON_BACKENDS:
+                raise ValueError(f"{path} was recorded on an unknown dungeon backend {settings.backend!r}")
+        else:
+            raise ValueError(f"unsupported session log version {header[1]}")
+        commands = [line.rstrip("\n") for line in log]
+    return settings, commands
+
+
+def record_session(path, seed=None, backend="objects", size=5, generator="grid"):
+    # Play at the console as usual; the log is written however the game ends
+    recorder = SessionRecorder()
+    settings = SessionSettings(seed, backend, size, generator)
+    engine = GameEngine(input_func=recorder, dungeon_factory=session_factory(settings), seed=seed)
+    try:
+        engine.start_game()
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        save_session(path, settings._replace(seed=engine.seed), recorder.commands)
+    return engine
+
+
+def replay_session(path, output=None, dungeon_factory=Dungeon):
+    # Re-run a log headless on the dungeons it was recorded with (or, for a
+    # version 1 log, `dungeon_factory`). Returns the RunResult and commands
+    # per second.
+    settings, commands = load_session(path)
+    if settings.backend is not None:
+        dungeon_factory = session_factory(settings)
+    start = time.perf_counter()
+    result = run_headless(ScriptedPolicy(commands), seed=settings.seed, max_turns=None, output=output,
+                          dungeon_factory=dungeon_factory)
+    elapsed = time.perf_counter() - start
+    return result, (len(commands) / elapsed if elapsed > 0 else float("inf"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Record or replay dungeon sessions.",
+        epilog="Replays rebuild the dungeons recorded in the log; --size, --lazy, --array and --generator "
+               "only apply to recordings and to version 1 logs.")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("log", help="session log path (.gz to compress)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for a new recording")
+    parser.add_argument("--size", type=int, default=5, help="dungeon width and height")
+    backend = parser.add_mutually_exclusive_group()
+    backend.add_argument("--lazy", action="store_true", help="materialize rooms on demand")
+    backend.add_argument("--array", action="store_true", help="keep rooms as NumPy columns")
+    parser.add_argument("--generator", choices=list(GENERATORS), default="grid",
+                        help="dungeon layout (only grid with --lazy)")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the log this many times")
+    parser.add_argument("--show-output", action="store_true", help="print the replayed game text")
+    args = parser.parse_args()
+
+    if args.lazy and args.generator != "grid":
+        parser.error("--lazy only supports --generator grid")
+    backend = "lazy" if args.lazy else "arrays" if args.array else "objects"
+    if args.mode == "record":
+        record_session(args.log, seed=args.seed, backend=backend, size=args.size, generator=args.generator)
+    else:
+        dungeon_factory = session_factory(SessionSettings(None, backend, args.size, args.generator))
+        for _ in range(args.repeat):
+            output = [] if args.show_output else None
+            result, commands_per_second = replay_session(args.log, output=output,
+                                                         dungeon_factory=dungeon_factory)
+            if output is not None:
+                print("\n".join(output))
+            print(f"{result} ({commands_per_second:.0f} commands/s)")
@@ -0,0 +1,216 @@
+import abc
+import argparse
+import asyncio
+import functools
+
+from game import Dungeon, GameEngine, GameState
+from generators import GENERATORS
+from lazy_dungeon import LazyDungeon
+from metrics import GameMetrics, serve_metrics
+
+# Line protocol: the server sends game text line by line, then the prompt on
+# a line of its own starting with PROMPT_MARKER, and waits for one command
+# line. It closes the connection once the game is over.
+PROMPT_MARKER = "> "
+
+
+class Channel(abc.ABC):
+    # Async input/output for one session. write() only buffers; the buffer is
+    # flushed when the session asks for the next command, so each turn costs
+    # one transport write.
+    def __init__(self):
+        self.buffer = []
+
+    def write(self, text):
+        self.buffer.append(text)
+
+    @abc.abstractmethod
+    async def ask(self, prompt):
+        # Send the pending output plus `prompt`, then wait for a command.
+        # Returns None once the other end has gone away.
+        ...
+
+    @abc.abstractmethod
+    async def close(self):
+        ...
+
+    def _take_output(self, prompt=None):
+        lines = self.buffer
+        self.buffer = []
+        if prompt is not None:
+            lines.append(PROMPT_MARKER + prompt.strip())
+        return "".join(line + "\n" for line in lines)
+
+
+class StreamChannel(Channel):
+    # Channel over an asyncio reader/writer pair (TCP, Unix socket, pipe...)
+    def __init__(self, reader, writer):
+        super().__init__()
+        self.reader = reader
+        self.writer = writer
+
+    async def ask(self, prompt):
+        self.writer.write(self._take_output(prompt).encode())
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            return None
+        return line.decode(errors="replace").rstrip("\r\n")
+
+    async def close(self):
+        if self.buffer:
+            self.writer.write(self._take_output().encode())
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+class QueueChannel(Channel):
+    # In-process channel: commands are put on `commands`, and each flushed
+    # chunk of output (ending with its prompt) arrives on `responses`. A None
+    # command ends the session.
+    def __init__(self):
+        super().__init__()
+        self.commands = asyncio.Queue()
+        self.responses = asyncio.Queue()
+
+    async def ask(self, prompt):
+        await self.responses.put(self._take_output(prompt))
+        return await self.commands.get()
+
+    async def close(self):
+        await self.responses.put(self._take_output())
+
+
+async def run_session(channel, seed=None, dungeon_factory=Dungeon, metrics=None):
+    # Play one GameEngine over `channel` until the game ends or the player
+    # disconnects. The engine's turn() generator hands us each prompt, so no
+    # thread ever blocks waiting for input. Stages aren't prefetched: a
+    # builder thread per session would fight the event loop for the GIL, and
+    # waiting on an unfinished build would stall every session in the loop.
+    engine = GameEngine(input_func=None, output_func=channel.write, dungeon_factory=dungeon_factory,
+                        seed=seed, prefetch_stages=False)
+    if metrics is not None:
+        metrics.attach(engine)
+    channel.write("Welcome to the Python Dungeon Crawler!")
+    try:
+        while engine.game_state != GameState.GAME_OVER:
+            turn = engine.turn()
+            try:
+                prompt = next(turn)
+                while True:
+                    engine.output.flush()
+                    command = await channel.ask(prompt)
+                    if command is None:
+                        return engine
+                    prompt = turn.send(command)
+            except StopIteration:
+                pass
+    finally:
+        await channel.close()
+    return engine
+
+
+class GameServer:
+    # Line-based TCP front end running every session in one event loop
+    def __init__(self, host="127.0.0.1", port=8023, dungeon_factory=Dungeon, metrics=None):
+        self.host = host
+        self.port = port
+        self.dungeon_factory = dungeon_factory
+        self.metrics = metrics  # One GameMetrics shared by every session, if any
+        self.active_sessions = 0
+        self.total_sessions = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Port 0 picks a free port; report the real one
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        self.active_sessions += 1
+        self.total_sessions += 1
+        try:
+            await run_session(StreamChannel(reader, writer), dungeon_factory=self.dungeon_factory,
+                              metrics=self.metrics)
+        except ConnectionError:
+            pass
+        finally:
+            self.active_sessions -= 1
+
+
+class LineClient:
+    # Minimal client for the line protocol, e.g. for loopback testing
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8023):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def read_until_prompt(self):
+        # Returns (output lines, prompt); prompt is None once the server hangs up
+        lines = []
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return lines, None
+            line = line.decode().rstrip("\n")
+            if line.startswith(PROMPT_MARKER):
+                return lines, line[len(PROMPT_MARKER):]
+            lines.append(line)
+
+    async def send(self, command):
+        self.writer.write((command + "\n").encode())
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the dungeon crawler over a line-based TCP protocol.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8023)
+    parser.add_argument("--size", type=int, default=5, help="dungeon width and height")
+    parser.add_argument("--lazy", action="store_true", help="materialize rooms on demand")
+    parser.add_argument("--generator", choices=list(GENERATORS), default="grid",
+                        help="dungeon layout (only grid with --lazy)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics at http://HOST:PORT/metrics")
+    args = parser.parse_args()
+
+    if args.lazy and args.generator != "grid":
+        parser.error("--lazy only supports --generator grid")
+    dungeon_factory = functools.partial(LazyDungeon if args.lazy else Dungeon, size=args.size,
+                                        generator=args.generator)
+    metrics = None
+    if args.metrics_port is not None:
+        metrics = GameMetrics()
+        serve_metrics(metrics, args.host, args.metrics_port)
+        print(f"Metrics on http://{args.host}:{args.metrics_port}/metrics")
+    game_server = GameServer(args.host, args.port, dungeon_factory=dungeon_factory, metrics=metrics)
+    print(f"Serving on {args.host}:{args.port}")
+    try:
+        asyncio.run(game_server.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,144 @@
+import os
+import secrets
+import struct
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from array_dungeon import ArrayDungeon
+
+LAYOUT_MAGIC = b"DGNLAYT\0"
+LAYOUT_VERSION = 1
+# magic, version, size, description bytes
+HEADER = struct.Struct("<8sIIQ")
+
+_attached = {}  # {block name: SharedLayout} attached by this process
+
+
+def _padded(length):
+    return -length % 8
+
+
+class SharedLayout:
+    # The part of a dungeon that every stage of one size has in common: the
+    # exit bitmask of every cell and the base room descriptions (a stage
+    # appends its own portal or boss text). It lives in a read-only shared
+    # memory block,
+    #
+    #   header | exits (u1 per cell) | description offsets (<u4, cells + 1) | UTF-8 text
+    #
+    # so every process attached to it reads the same pages. Instances pickle
+    # as the block's name and re-attach on the other side.
+    def __init__(self, block, owner=False):
+        self.block = block
+        self.name = block.name
+        self.owner = owner  # Only the publishing process unlinks the block
+        magic, version, self.size, text_bytes = HEADER.unpack_from(block.buf, 0)
+        if magic != LAYOUT_MAGIC:
+            raise ValueError(f"shared memory block {block.name} is not a dungeon layout")
+        if version != LAYOUT_VERSION:
+            raise ValueError(f"unsupported dungeon layout version {version}")
+
+        cells = self.size * self.size
+        offset = HEADER.size
+        self.exits = np.ndarray(cells, dtype=np.uint8, buffer=block.buf, offset=offset)
+        self.exits.flags.writeable = False
+        offset += cells + _padded(cells)
+        self.offsets = np.ndarray(cells + 1, dtype="<u4", buffer=block.buf, offset=offset)
+        self.offsets.flags.writeable = False
+        offset += self.offsets.nbytes + _padded(self.offsets.nbytes)
+        self.text = block.buf[offset:offset + text_bytes]
+
+    @classmethod
+    def publish(cls, size, name=None):
+        # Build the layout once and copy it into a new block
+        template = ArrayDungeon(size, seed=0)
+        descriptions = template.base_descriptions()
+        text = "".join(descriptions)
+        if text.isascii():
+            lengths = np.fromiter(map(len, descriptions), dtype=np.int64, count=len(descriptions))
+            text = text.encode()
+        else:
+            encoded = [description.encode() for description in descriptions]
+            lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+            text = b"".join(encoded)
+        offsets = np.zeros(len(descriptions) + 1, dtype="<u4")
+        np.cumsum(lengths, out=offsets[1:])
+
+        cells = size * size
+        nbytes = (HEADER.size + cells + _padded(cells) + offsets.nbytes + _padded(offsets.nbytes)
+                  + len(text))
+        block = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+        HEADER.pack_into(block.buf, 0, LAYOUT_MAGIC, LAYOUT_VERSION, size, len(text))
+        offset = HEADER.size
+        block.buf[offset:offset + cells] = template.exits.tobytes()
+        offset += cells + _padded(cells)
+        block.buf[offset:offset + offsets.nbytes] = offsets.tobytes()
+        offset += offsets.nbytes + _padded(offsets.nbytes)
+        block.buf[offset:offset + len(text)] = text
+        layout = cls(block, owner=True)
+        _attached[layout.name] = layout
+        return layout
+
+    @classmethod
+    def attach(cls, name):
+        # This process's view of a published block, opened on first use
+        layout = _attached.get(name)
+        if layout is None:
+            layout = _attached[name] = cls(shared_memory.SharedMemory(name=name))
+        return layout
+
+    def __reduce__(self):
+        return SharedLayout.attach, (self.name,)
+
+    def description(self, index):
+        return bytes(self.text[int(self.offsets[index]):int(self.offsets[index + 1])]).decode()
+
+    def close(self):
+        # Detach, and remove the block too if this process published it.
+        # Dungeons still using the layout keep their pages mapped.
+        _attached.pop(self.name, None)
+        if self.owner:
+            self.block.unlink()
+            self.owner = False
+        self.exits = self.offsets = None
+        self.text.release()
+        try:
+            self.block.close()
+        except BufferError:
+            pass  # Views handed to live dungeons; unmapped when they go
+
+
+class SharedLayouts:
+    # Layouts for the given dungeon sizes, published by the process that
+    # creates this and looked up by ArrayDungeon(layouts=...). Pickles as
+    # block names, so a dungeon factory holding it can go to pool workers,
+    # which attach instead of building their own exit graph.
+    #
+    #   with SharedLayouts(200) as layouts:
+    #       factory = functools.partial(ArrayDungeon, size=200, layouts=layouts)
+    def __init__(self, *sizes):
+        prefix = f"dgn{os.getpid()}{secrets.token_hex(4)}"
+        self.layouts = {size: SharedLayout.publish(size, f"{prefix}-{size}") for size in sizes}
+
+    def get(self, size):
+        return self.layouts.get(size)  # None: not published, the dungeon builds its own
+
+    def __getstate__(self):
+        return {size: layout.name for size, layout in self.layouts.items()}
+
+    def __setstate__(self, names):
+        self.layouts = {size: SharedLayout.attach(name) for size, name in names.items()}
+
+    def nbytes(self):
+        return sum(layout.block.size for layout in self.layouts.values())
+
+    def close(self):
+        for layout in self.layouts.values():
+            layout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,248 @@
+import argparse
+import functools
+import multiprocessing
+import os
+import random
+import time
+from collections import Counter, namedtuple
+
+from array_dungeon import ArrayDungeon
+from autoplay import ExpectimaxPolicy
+from game import Dungeon, GameEngine, GameState
+from generators import GENERATORS
+from lazy_dungeon import LazyDungeon
+from metrics import GameMetrics
+from navigation import NavigationIndex
+from shared_layout import SharedLayouts
+
+# Outcome of one headless run
+RunResult = namedtuple("RunResult", ["seed", "outcome", "stage_reached", "turns",
+                                     "cause_of_death", "level", "gold", "xp"])
+
+
+class PolicyExhausted(Exception):
+    pass
+
+
+def _is_upgrade_prompt(prompt):
+    return prompt.startswith("Choose an upgrade")
+
+
+class ScriptedPolicy:
+    # Plays back a fixed list of commands, ending the run when they run out
+    def __init__(self, commands):
+        self.commands = iter(commands)
+
+    def choose(self, engine, prompt):
+        try:
+            return next(self.commands)
+        except StopIteration:
+            raise PolicyExhausted()
+
+
+class RandomPolicy:
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def choose(self, engine, prompt):
+        if engine.game_state == GameState.BATTLE:
+            return "flee" if self.rng.random() < 0.1 else "attack"
+        if engine.game_state == GameState.HUB:
+            if _is_upgrade_prompt(prompt):
+                return self.rng.choice(["1", "2", "3"])
+            return self.rng.choice(["upgrade", "continue"])
+
+        room = engine.current_room
+        if room.enemies:
+            return "attack"
+        if room.items:
+            return f"take {next(iter(room.items)).lower()}"
+        options = [f"move {direction}" for direction in room.exits]
+        options.append("move portal")
+        return self.rng.choice(options)
+
+
+class GreedyPolicy:
+    # Fights everything, picks up everything and sweeps the grid column by
+    # column so every room is visited before heading for the exit. Carved
+    # layouts (or walls in the way) can't be swept, so there it walks to the
+    # nearest enemy, or to the portal once the stage is cleared.
+    def __init__(self, seed=None):
+        self.heading = "north"  # Direction of travel along the last column
+
+    def choose(self, engine, prompt):
+        player = engine.player
+        if engine.game_state == GameState.BATTLE:
+            return "attack"
+        if engine.game_state == GameState.HUB:
+            can_upgrade_attack = player.gold >= 20 and player.xp >= 50
+            can_upgrade_hp = player.gold >= 15 and player.xp >= 40
+            if _is_upgrade_prompt(prompt):
+                if can_upgrade_attack:
+                    return "1"
+                if can_upgrade_hp:
+                    return "2"
+                return "3"
+            return "upgrade" if can_upgrade_attack or can_upgrade_hp else "continue"
+
+        room = engine.current_room
+        if room.enemies:
+            return "attack"
+        if room.items:
+            return f"take {next(iter(room.items)).lower()}"
+        dungeon = engine.dungeon
+        direction = self._sweep_direction(room, dungeon.size) if dungeon.generator == "grid" else None
+        if direction not in room.exits:
+            direction = self._route(dungeon, room)
+        return f"move {direction}"
+
+    def _route(self, dungeon, room):
+        navigation = NavigationIndex.of(dungeon)
+        field = navigation.exit_field if dungeon.is_cleared() else navigation.enemy_field
+        path = field.path_from(room.coords)
+        if path is None:
+            return next(iter(room.exits), "portal")
+        return path[0] if path else "portal"
+
+    def _sweep_direction(self, room, size):
+        x, y = room.coords
+        if x == size - 1:
+            # Last column: pace up and down it until the stage is cleared
+            if y == size - 1:
+                self.heading = "south"
+            elif y == 0:
+                self.heading = "north"
+            return self.heading
+        if x % 2 == 0:
+            return "north" if y < size - 1 else "east"
+        return "south" if y > 0 else "east"
+
+
+POLICIES = {
+    "scripted": ScriptedPolicy,
+    "random": RandomPolicy,
+    "greedy": GreedyPolicy,
+    "expectimax": ExpectimaxPolicy,
+}
+
+
+def run_headless(policy, seed=None, max_turns=10000, output=None, dungeon_factory=Dungeon, metrics=None):
+    # Drive a GameEngine with `policy` instead of the console. Output is
+    # discarded unless a list is passed in to capture it; max_turns=None
+    # runs until the game or the policy ends. Pass a GameMetrics to record
+    # the run into it. Policies answer the hub at once, so there is no idle
+    # time to build the next stage in and it isn't prefetched.
+    engine = GameEngine(input_func=lambda prompt: policy.choose(engine, prompt),
+                        output_func=output.append if output is not None else None,
+                        dungeon_factory=dungeon_factory, seed=seed, terse=output is None,
+                        prefetch_stages=False)
+    if metrics is not None:
+        metrics.attach(engine)
+
+    turns = 0
+    outcome = "turn_limit"
+    try:
+        while max_turns is None or turns < max_turns:
+            if engine.game_state == GameState.GAME_OVER:
+                break
+            engine.step()
+            turns += 1
+    except PolicyExhausted:
+        outcome = "script_end"
+
+    cause_of_death = None
+    if engine.game_state == GameState.GAME_OVER:
+        outcome = "death"
+        if engine.current_enemy is not None:
+            cause_of_death = engine.current_enemy.name
+
+    return RunResult(seed=seed, outcome=outcome, stage_reached=engine.current_stage, turns=turns,
+                     cause_of_death=cause_of_death, level=engine.player.level,
+                     gold=engine.player.gold, xp=engine.player.xp)
+
+
+def _run_seeded(args):
+    policy_factory, seed, max_turns, dungeon_factory, collect_metrics = args
+    metrics = GameMetrics() if collect_metrics else None
+    result = run_headless(policy_factory(seed), seed=seed, max_turns=max_turns,
+                          dungeon_factory=dungeon_factory, metrics=metrics)
+    return result, metrics
+
+
+def run_batch(runs, policy_factory=GreedyPolicy, base_seed=0, max_turns=10000, processes=None,
+              dungeon_factory=Dungeon, metrics=None):
+    # Spread `runs` seeded runs over a process pool (one worker per core by
+    # default). Returns the results in seed order and the runs per second.
+    # Every run's metrics are merged into `metrics` if one is passed.
+    processes = processes or os.cpu_count() or 1
+    jobs = [(policy_factory, seed, max_turns, dungeon_factory, metrics is not None)
+            for seed in range(base_seed, base_seed + runs)]
+    chunksize = max(1, runs // (processes * 8))
+
+    start = time.perf_counter()
+    if processes == 1:
+        results = [_run_seeded(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_run_seeded, jobs, chunksize=chunksize)
+    elapsed = time.perf_counter() - start
+
+    if metrics is not None:
+        for _, run_metrics in results:
+            metrics.merge(run_metrics)
+    results = [result for result, _ in results]
+
+    return results, (runs / elapsed if elapsed > 0 else float("inf"))
+
+
+def summarize(results, runs_per_second):
+    outcomes = Counter(result.outcome for result in results)
+    causes = Counter(result.cause_of_death for result in results if result.cause_of_death)
+    mean_stage = sum(result.stage_reached for result in results) / len(results)
+    mean_turns = sum(result.turns for result in results) / len(results)
+    lines = [f"Runs: {len(results)} ({runs_per_second:.1f} runs/s)",
+             f"Mean stage reached: {mean_stage:.2f}",
+             f"Mean turns: {mean_turns:.1f}",
+             f"Outcomes: {dict(outcomes)}",
+             f"Causes of death: {dict(causes)}"]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run headless dungeon simulations.")
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--policy", choices=["random", "greedy", "expectimax"], default="greedy")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first run")
+    parser.add_argument("--max-turns", type=int, default=10000)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--size", type=int, default=5, help="dungeon width and height")
+    parser.add_argument("--lazy", action="store_true", help="materialize rooms on demand")
+    parser.add_argument("--generator", choices=list(GENERATORS), default="grid",
+                        help="dungeon layout (only grid with --lazy or --shared-layout)")
+    parser.add_argument("--shared-layout", action="store_true",
+                        help="array-backed dungeons whose exit graph and descriptions every worker shares")
+    parser.add_argument("--metrics", default=None,
+                        help="write aggregated metrics here (JSON for *.json, Prometheus text otherwise)")
+    args = parser.parse_args()
+    if (args.lazy or args.shared_layout) and args.generator != "grid":
+        parser.error("--lazy and --shared-layout only support --generator grid")
+
+    layouts = None
+    if args.shared_layout:
+        layouts = SharedLayouts(args.size)
+        dungeon_factory = functools.partial(ArrayDungeon, size=args.size, layouts=layouts)
+    else:
+        dungeon_factory = functools.partial(LazyDungeon if args.lazy else Dungeon, size=args.size,
+                                            generator=args.generator)
+    metrics = GameMetrics() if args.metrics else None
+    try:
+        results, runs_per_second = run_batch(args.runs, POLICIES[args.policy], base_seed=args.seed,
+                                             max_turns=args.max_turns, processes=args.processes,
+                                             dungeon_factory=dungeon_factory, metrics=metrics)
+    finally:
+        if layouts is not None:
+            layouts.close()
+    print(summarize(results, runs_per_second))
+    if metrics is not None:
+        metrics.write(args.metrics)
+        print(f"Wrote {args.metrics}")
@@ -0,0 +1,379 @@
+import argparse
+import functools
+import json
+import mmap
+import os
+import random
+import struct
+
+import numpy as np
+
+from array_dungeon import ITEM_NAMES, ArrayDungeon
+from game import (BOSS_ENEMY, ENEMY_REGISTRY, WANDERING_ENEMIES, Dungeon, Enemy, EnemyTemplate, GameEngine,
+                  GameState)
+from generators import GENERATORS
+from inventory import Inventory
+from lazy_dungeon import LazyDungeon
+
+# Snapshot file layout (all little-endian):
+#   header    SNAPSHOT_MAGIC, format version and the length of the metadata
+#   metadata  UTF-8 JSON: engine, player and RNG state, the dungeon's enemy
+#             templates and whatever doesn't fit the per-room columns
+#   columns   one flat array per entry of COLUMN_DTYPES, a cell per room
+#             (index x * size + y), each padded to an 8-byte boundary
+# Exits are stored as per-room bitmasks of neighbouring coordinates, never as
+# references, and room descriptions are rebuilt from the coordinates.
+SNAPSHOT_MAGIC = b"DGNSNAP\0"
+SNAPSHOT_VERSION = 1
+HEADER = struct.Struct("<8sIQ")
+COLUMN_DTYPES = [("enemy_hp", "<i4"), ("exits", "u1"), ("enemy_kind", "i1"), ("items", "u1"),
+                 ("visited", "?")]
+ITEM_CODES = {name: code for code, name in enumerate(ITEM_NAMES) if name is not None}  # items column values
+
+
+def _padded(length):
+    return -length % 8
+
+
+class _TemplateTable:
+    # Numbers the enemy templates a snapshot refers to
+    def __init__(self, templates=()):
+        self.templates = list(templates)
+        self.indexes = {template: index for index, template in enumerate(self.templates)}
+
+    def index(self, template):
+        index = self.indexes.get(template)
+        if index is None:
+            index = self.indexes[template] = len(self.templates)
+            self.templates.append(template)
+        return index
+
+
+def _room_enemies(columns, extra_enemies, templates, index, enemies):
+    # The first enemy of a room goes in the columns, the rest are extras
+    columns["enemy_kind"][index] = templates.index(enemies[0].template) if enemies else -1
+    columns["enemy_hp"][index] = enemies[0].hp if enemies else 0
+    extra_enemies.pop(index, None)
+    if len(enemies) > 1:
+        extra_enemies[index] = enemies[1:]
+
+
+def _split_items(items):
+    # (items column code of the room's first item if it is a stock item,
+    # else 0; the rest as a list of extras, or None)
+    stacks = items.stacks()
+    if len(stacks) == 1 and stacks[0][1] == 1 and stacks[0][0] in ITEM_CODES:
+        return ITEM_CODES[stacks[0][0]], None  # The usual single stock item
+    items = list(items)
+    code = ITEM_CODES.get(items[0], 0) if items else 0
+    extras = items[1:] if code else items
+    return code, extras or None
+
+
+def _room_items(columns, extra_items, index, items):
+    # Likewise the first stock item, with the rest as extras
+    columns["items"][index], extras = _split_items(items)
+    extra_items.pop(index, None)
+    if extras:
+        extra_items[index] = extras
+
+
+def _room_columns(dungeon, templates):
+    # Columns for a dungeon made of Room objects, split into columns and
+    # extras the same way ArrayDungeon does. Exits come from the layout's
+    # bitmasks, and enemies, items and visited flags from the dungeon's
+    # indexes, so rooms that hold nothing are never touched.
+    size = dungeon.size
+    cells = size * size
+    columns = {name: np.zeros(cells, dtype=dtype) for name, dtype in COLUMN_DTYPES}
+    columns["enemy_kind"][:] = -1
+    columns["exits"][:] = dungeon.exit_bitmasks()
+    columns["visited"][[x * size + y for x, y in dungeon.visited_coords]] = True
+
+    indexes = []
+    firsts = []
+    extra_enemies = {}
+    for (x, y), room in dungeon.enemy_rooms.items():
+        enemies = room.enemies
+        indexes.append(x * size + y)
+        firsts.append(enemies[0])
+        if len(enemies) > 1:
+            extra_enemies[x * size + y] = enemies[1:]
+    kinds = {template: templates.index(template) for template in {enemy.template for enemy in firsts}}
+    columns["enemy_kind"][indexes] = [kinds[enemy.template] for enemy in firsts]
+    columns["enemy_hp"][indexes] = [enemy.hp for enemy in firsts]
+
+    indexes = []
+    codes = []
+    extra_items = {}
+    for (x, y), room in dungeon.item_rooms.items():
+        code, extras = _split_items(room.items)
+        indexes.append(x * size + y)
+        codes.append(code)
+        if extras:
+            extra_items[x * size + y] = extras
+    columns["items"][indexes] = codes
+    return columns, extra_enemies, extra_items
+
+
+def _lazy_room_columns(dungeon, templates):
+    # Columns for a LazyDungeon, without materializing its rooms: the
+    # pristine placement columns, overlaid with the rooms it has changed
+    # (deltas) or still has cached. Rooms outside the cache have forgotten
+    # whether they were visited.
+    size = dungeon.size
+    cells = size * size
+    columns = {name: np.zeros(cells, dtype=dtype) for name, dtype in COLUMN_DTYPES}
+    columns["enemy_kind"][:] = -1
+    columns["exits"][:] = dungeon.exit_bitmasks()
+    extra_enemies = {}
+    extra_items = {}
+
+    if dungeon.is_boss_stage:
+        boss = ENEMY_REGISTRY.template(BOSS_ENEMY, dungeon.stage_level, is_boss=True)
+        exit_index = dungeon.exit_coords[0] * size + dungeon.exit_coords[1]
+        columns["enemy_kind"][exit_index] = templates.index(boss)
+        columns["enemy_hp"][exit_index] = boss.max_hp
+    else:
+        enemy_codes = bytearray()
+        item_codes = bytearray()
+        for x in range(size):
+            # Cached columns are reused, the rest generated without churning the cache
+            column = dungeon._pristine_column(x)
+            enemy_codes += column[0]
+            item_codes += column[1]
+        # Enemy codes are 1-based indexes into WANDERING_ENEMIES
+        wandering = [ENEMY_REGISTRY.template(name, dungeon.stage_level) for name in WANDERING_ENEMIES]
+        kinds = np.array([-1] + [templates.index(template) for template in wandering], dtype=np.int8)
+        max_hp = np.array([0] + [template.max_hp for template in wandering], dtype=np.int32)
+        enemy_codes = np.frombuffer(enemy_codes, dtype=np.uint8)
+        columns["enemy_kind"][:] = kinds[enemy_codes]
+        columns["enemy_hp"][:] = max_hp[enemy_codes]
+        columns["items"][:] = np.frombuffer(item_codes, dtype=np.uint8)  # Same codes as ITEM_NAMES
+
+    changed = dict(dungeon._deltas)
+    for coords, room in dungeon._rooms.items():
+        changed[coords] = (room.enemies, room.items)
+        if room.visited:
+            columns["visited"][coords[0] * size + coords[1]] = True
+    for (x, y), (enemies, items) in changed.items():
+        _room_enemies(columns, extra_enemies, templates, x * size + y, enemies)
+        _room_items(columns, extra_items, x * size + y, items)
+    return columns, extra_enemies, extra_items
+
+
+def _dungeon_columns(dungeon):
+    # ArrayDungeon already keeps its rooms as columns, so those are written
+    # as they are; anything else is converted room by room
+    if isinstance(dungeon, ArrayDungeon):
+        templates = _TemplateTable(dungeon.enemy_templates)
+        columns = {name: getattr(dungeon, name) for name, _ in COLUMN_DTYPES}
+        extra_enemies, extra_items = dungeon.extra_enemies, dungeon.extra_items
+    elif isinstance(dungeon, LazyDungeon):
+        templates = _TemplateTable()
+        columns, extra_enemies, extra_items = _lazy_room_columns(dungeon, templates)
+    else:
+        templates = _TemplateTable()
+        columns, extra_enemies, extra_items = _room_columns(dungeon, templates)
+
+    metadata = {
+        "size": dungeon.size,
+        "stage_level": dungeon.stage_level,
+        "is_boss_stage": dungeon.is_boss_stage,
+        "seed": dungeon.seed,
+        "generator": dungeon.generator,
+        "extra_enemies": {str(index): [[templates.index(enemy.template), enemy.hp] for enemy in enemies]
+                          for index, enemies in extra_enemies.items() if enemies},
+        "extra_items": {str(index): list(items) for index, items in extra_items.items() if items},
+    }
+    # Numbered last, after the extras may have added templates of their own
+    metadata["templates"] = [list(template) for template in templates.templates]
+    return metadata, columns
+
+
+def _engine_metadata(engine):
+    player = engine.player
+    rng_version, rng_internal, rng_gauss = engine.rng.getstate()
+    enemy = None
+    if engine.current_enemy is not None:
+        room_enemies = engine.current_room.enemies
+        if engine.current_enemy in room_enemies:
+            enemy = {"room_index": room_enemies.index(engine.current_enemy)}
+        else:
+            # A random encounter, which doesn't live in any room
+            enemy = {"template": list(engine.current_enemy.template), "hp": engine.current_enemy.hp}
+    return {
+        "engine": {
+            "seed": engine.seed,
+            "rng": [rng_version, list(rng_internal), rng_gauss],
+            "state": engine.game_state.name,
+            "stage": engine.current_stage,
+            "room": list(engine.current_room.coords),
+            "enemy": enemy,
+        },
+        "player": {
+            "name": player.name,
+            "max_hp": player.max_hp,
+            "hp": player.hp,
+            "attack": player.attack,
+            "defense": player.defense,
+            "xp": player.xp,
+            "level": player.level,
+            "gold": player.gold,
+            "inventory": list(player.inventory),
+        },
+    }
+
+
+def save_game(engine, path):
+    # Write a snapshot of `engine` to `path`. The file is written next to it
+    # and renamed into place, so a crash never leaves a half-written save.
+    metadata = _engine_metadata(engine)
+    metadata["dungeon"], columns = _dungeon_columns(engine.dungeon)
+    encoded = json.dumps(metadata, separators=(",", ":")).encode()
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as snapshot:
+        snapshot.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(encoded)))
+        snapshot.write(encoded)
+        snapshot.write(b"\0" * _padded(len(encoded)))
+        for name, dtype in COLUMN_DTYPES:
+            column = np.ascontiguousarray(columns[name], dtype=dtype)
+            snapshot.write(memoryview(column).cast("B"))
+            snapshot.write(b"\0" * _padded(column.nbytes))
+    os.replace(temp_path, path)
+
+
+def _read_snapshot(path, use_mmap):
+    # Returns (metadata, {column name: array}). With use_mmap the columns are
+    # copy-on-write views of the mapped file: pages are only read when a room
+    # is touched, and changes made while playing never reach the file.
+    with open(path, "rb") as snapshot:
+        if use_mmap:
+            buffer = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_COPY)
+        else:
+            buffer = bytearray(snapshot.read())
+
+    if len(buffer) < HEADER.size:
+        raise ValueError(f"{path} is not a game snapshot")
+    magic, version, metadata_length = HEADER.unpack_from(buffer, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a game snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"unsupported snapshot version {version}")
+
+    offset = HEADER.size
+    metadata = json.loads(bytes(buffer[offset:offset + metadata_length]))
+    offset += metadata_length + _padded(metadata_length)
+
+    cells = metadata["dungeon"]["size"] ** 2
+    columns = {}
+    for name, dtype in COLUMN_DTYPES:
+        column = np.frombuffer(buffer, dtype=dtype, count=cells, offset=offset)
+        columns[name] = column
+        offset += column.nbytes + _padded(column.nbytes)
+    return metadata, columns
+
+
+def _restore_dungeon(metadata, columns):
+    templates = [EnemyTemplate(*template) for template in metadata["templates"]]
+    columns = dict(columns)
+    columns["enemy_templates"] = templates
+    columns["extra_enemies"] = {int(index): [Enemy(templates[kind], hp) for kind, hp in enemies]
+                                for index, enemies in metadata["extra_enemies"].items()}
+    columns["extra_items"] = {int(index): Inventory(items) for index, items in metadata["extra_items"].items()}
+    return ArrayDungeon(metadata["size"], metadata["stage_level"], metadata["is_boss_stage"],
+                        seed=metadata["seed"], columns=columns, generator=metadata.get("generator", "grid"))
+
+
+def load_game(path, input_func=input, output_func=print, dungeon_factory=Dungeon, use_mmap=True,
+              terse=False):
+    # Resume a saved game. The saved stage comes back as an ArrayDungeon over
+    # the snapshot's columns (whatever backend it was played on); later
+    # stages are built by `dungeon_factory` as usual.
+    metadata, columns = _read_snapshot(path, use_mmap)
+    state = metadata["engine"]
+    rng_version, rng_internal, rng_gauss = state["rng"]
+    rng = random.Random()
+    rng.setstate((rng_version, tuple(rng_internal), rng_gauss))
+
+    engine = GameEngine(input_func=input_func, output_func=output_func, dungeon_factory=dungeon_factory,
+                        rng=rng, terse=terse, dungeon=_restore_dungeon(metadata["dungeon"], columns))
+    engine.seed = state["seed"]
+    engine.current_stage = state["stage"]
+    engine.game_state = GameState[state["state"]]
+    engine.current_room = engine.dungeon.get_room(tuple(state["room"]))
+
+    enemy = state["enemy"]
+    if enemy is not None:
+        if "room_index" in enemy:
+            engine.current_enemy = engine.current_room.enemies[enemy["room_index"]]
+        else:
+            engine.current_enemy = Enemy(EnemyTemplate(*enemy["template"]), enemy["hp"])
+
+    player = engine.player
+    for field, value in metadata["player"].items():
+        setattr(player, field, value)
+    player.inventory = Inventory(player.inventory)
+    return engine
+
+
+class AutoCheckpoint:
+    # Steps `engine` and saves it to `path` every `every` turns, whenever a
+    # new stage begins and when the game ends
+    def __init__(self, engine, path, every=50):
+        self.engine = engine
+        self.path = path
+        self.every = every
+        self.turns = 0
+        self.stage = engine.current_stage
+
+    def step(self):
+        self.engine.step()
+        self.turns += 1
+        if (self.turns % self.every == 0 or self.engine.current_stage != self.stage
+                or self.engine.game_state == GameState.GAME_OVER):
+            self.save()
+
+    def save(self):
+        save_game(self.engine, self.path)
+        self.stage = self.engine.current_stage
+
+    def game_loop(self):
+        while self.engine.game_state != GameState.GAME_OVER:
+            self.step()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Play with automatic checkpoints, resuming from a snapshot.",
+        epilog="Array-backed stages (--array) save in milliseconds at any size. Object-backed (default) and "
+               "lazy stages are converted to columns on every save, which takes seconds around a million "
+               "rooms, so use --array for very large maps.")
+    parser.add_argument("path", help="snapshot file; resumed if it exists")
+    parser.add_argument("--every", type=int, default=50, help="turns between checkpoints")
+    parser.add_argument("--seed", type=int, default=None, help="seed of a new game")
+    parser.add_argument("--size", type=int, default=5, help="dungeon width and height")
+    backend = parser.add_mutually_exclusive_group()
+    backend.add_argument("--lazy", action="store_true", help="materialize rooms on demand")
+    backend.add_argument("--array", action="store_true", help="keep rooms as NumPy columns (fastest saves)")
+    parser.add_argument("--generator", choices=list(GENERATORS), default="grid",
+                        help="dungeon layout (only grid with --lazy)")
+    args = parser.parse_args()
+
+    if args.lazy and args.generator != "grid":
+        parser.error("--lazy only supports --generator grid")
+    dungeon_type = LazyDungeon if args.lazy else ArrayDungeon if args.array else Dungeon
+    dungeon_factory = functools.partial(dungeon_type, size=args.size, generator=args.generator)
+    if os.path.exists(args.path):
+        engine = load_game(args.path, dungeon_factory=dungeon_factory)
+        print(f"Resumed from {args.path} (stage {engine.current_stage}).")
+    else:
+        engine = GameEngine(dungeon_factory=dungeon_factory, seed=args.seed)
+        engine.output("Welcome to the Python Dungeon Crawler!")
+    checkpoint = AutoCheckpoint(engine, args.path, every=args.every)
+    try:
+        checkpoint.game_loop()
+    except (EOFError, KeyboardInterrupt):
+        checkpoint.save()
+        print(f"\nSaved to {args.path}.")
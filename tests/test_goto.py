@@ -0,0 +1,35 @@
+from game import Dungeon, GameEngine, GameState
+from lazy_dungeon import LazyDungeon
+from navigation import NavigationIndex
+
+
+def _engine(roll):
+    # A boss stage keeps every room but the exit free of enemies
+    dungeon = Dungeon(size=5, stage_level=5, is_boss_stage=True, seed=1)
+    engine = GameEngine(output_func=None, seed=1, dungeon=dungeon, prefetch_stages=False)
+    engine.rng.random = lambda: roll
+    return engine, engine.output  # Unflushed, so it holds everything said
+
+
+def test_goto_rolls_for_encounters_on_the_way():
+    engine, output = _engine(0.0)
+    engine._goto("0,4")
+    assert engine.current_room.coords == (0, 1)
+    assert engine.game_state == GameState.BATTLE and engine.current_enemy is not None
+    assert "You walk 1 room to (0,1)." in output
+
+
+def test_goto_leaves_the_last_room_to_the_next_turn():
+    engine, output = _engine(0.5)
+    engine._goto("0,4")
+    assert engine.current_room.coords == (0, 4)
+    assert engine.game_state == GameState.EXPLORATION and engine.current_enemy is None
+    assert "You walk 4 rooms to (0,4)." in output
+
+
+def test_goto_portal_takes_one_route_without_the_exit_field():
+    dungeon = LazyDungeon(size=200, seed=1)
+    navigation = NavigationIndex.of(dungeon)
+    path = navigation.path_to_exit((0, 0))
+    assert len(path) == 2 * 199 and navigation._exit_field is None
+    assert len(navigation.exit_field.path_from((0, 0))) == len(path)
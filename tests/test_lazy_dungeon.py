@@ -0,0 +1,53 @@
+from lazy_dungeon import LazyDungeon
+
+
+def _evict_all(dungeon):
+    # Look up enough other rooms to push everything else out of the cache
+    for x in range(dungeon.cache_size):
+        dungeon.get_room((x % 10, x // 10))
+
+
+def test_room_held_across_eviction_shares_state_with_cached_copy():
+    dungeon = LazyDungeon(size=100, seed=1, cache_size=64)
+    coords = next(coords for coords in dungeon.enemy_coords() if coords[0] > 80)
+    held = dungeon.get_room(coords)  # As the engine holds current_room
+    _evict_all(dungeon)
+    cached = dungeon.get_room(coords)
+    assert cached is not held
+
+    count = dungeon.enemy_count
+    held.remove_enemy(held.enemies[0])
+    assert dungeon.enemy_count == count - 1
+    assert cached.enemies == [] and dungeon.get_room(coords).enemies == []
+
+    held.add_item("Health Potion")
+    assert dungeon.get_room(coords).items.count("Health Potion") == held.items.count("Health Potion")
+
+
+def test_changes_survive_eviction():
+    dungeon = LazyDungeon(size=100, seed=2, cache_size=64)
+    coords = next(coords for coords in dungeon.enemy_coords() if coords[0] > 80)
+    room = dungeon.get_room(coords)
+    room.remove_enemy(room.enemies[0])
+    _evict_all(dungeon)
+    assert dungeon.get_room(coords).enemies == []
+    assert coords not in dungeon.enemy_coords()
+
+
+def test_enemy_totals_match_the_rooms():
+    dungeon = LazyDungeon(size=40, seed=3, column_cache_size=4)
+    assert not dungeon.is_cleared()
+    coords = sorted(dungeon.enemy_coords())
+    assert coords == sorted(c for c in dungeon.rooms if dungeon.get_room(c).enemies)
+    assert dungeon.enemy_count == dungeon.rooms_with_enemies_remaining() == len(coords)
+
+    for c in coords[:3]:
+        room = dungeon.get_room(c)
+        room.remove_enemy(room.enemies[0])
+    assert sorted(dungeon.enemy_coords()) == coords[3:]
+    assert dungeon.enemy_count == len(coords) - 3
+
+    for c in coords[3:]:
+        room = dungeon.get_room(c)
+        room.remove_enemy(room.enemies[0])
+    assert dungeon.enemy_coords() == [] and dungeon.is_cleared()
@@ -0,0 +1,28 @@
+import pytest
+
+from array_dungeon import ArrayDungeon
+from game import Dungeon
+from replay import SessionSettings, load_session, replay_session, save_session, session_factory
+
+
+def test_replay_rebuilds_the_recorded_dungeon(tmp_path):
+    path = str(tmp_path / "session.log.gz")
+    save_session(path, SessionSettings(7, "arrays", 9, "caves"), ["status"])
+    assert load_session(path) == (SessionSettings(7, "arrays", 9, "caves"), ["status"])
+
+    dungeon = session_factory(load_session(path)[0])(stage_level=1, is_boss_stage=False, seed=7)
+    assert isinstance(dungeon, ArrayDungeon) and dungeon.size == 9
+    result, _ = replay_session(path, dungeon_factory=Dungeon)
+    assert result.seed == 7 and result.outcome == "script_end"
+
+
+def test_version_1_logs_still_load(tmp_path):
+    path = tmp_path / "session.log"
+    path.write_text("dungeon-session 1 5\nstatus\n")
+    path = str(path)
+    assert load_session(path) == (SessionSettings(5, None, None, None), ["status"])
+
+
+def test_unseeded_sessions_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        save_session(str(tmp_path / "session.log"), SessionSettings(None, "objects", 5, "grid"), [])
@@ -0,0 +1,32 @@
+import pytest
+
+from array_dungeon import ArrayDungeon
+from game import Dungeon, Room
+from inventory import EMPTY_INVENTORY, Inventory
+from lazy_dungeon import LazyDungeon
+
+
+def test_rooms_without_items_share_the_empty_inventory():
+    room = Room("A room.")
+    assert room.items is EMPTY_INVENTORY
+    assert not room.remove_item("Health Potion")
+    room.add_item("Health Potion")
+    assert room.items is not EMPTY_INVENTORY and room.items.count("health potion") == 1
+    assert len(EMPTY_INVENTORY) == 0 and len(Room("Another room.").items) == 0
+
+
+def test_item_list_is_wrapped_in_an_inventory():
+    room = Room("A room.", items=["Health Potion", "health potion", "Rusty Sword"])
+    assert isinstance(room.items, Inventory)
+    room.add_item("Small Shield")
+    assert room.remove_item("HEALTH POTION")
+    assert room.items.summary() == "Health Potion, Rusty Sword, Small Shield"
+
+
+@pytest.mark.parametrize("size, is_boss_stage", [(1, False), (1, True), (4, False), (4, True)])
+def test_backends_describe_rooms_alike(size, is_boss_stage):
+    dungeons = [cls(size=size, stage_level=5, is_boss_stage=is_boss_stage, seed=1)
+                for cls in (Dungeon, LazyDungeon, ArrayDungeon)]
+    descriptions = [[dungeon.get_room((x, y)).description for x in range(size) for y in range(size)]
+                    for dungeon in dungeons]
+    assert descriptions[0] == descriptions[1] == descriptions[2]
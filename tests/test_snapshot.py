@@ -0,0 +1,54 @@
+import functools
+
+from game import Dungeon, GameEngine
+from lazy_dungeon import LazyDungeon
+from snapshot import load_game, save_game
+
+
+def _engine(dungeon_type, **kwargs):
+    return GameEngine(output_func=None, terse=True, seed=4, prefetch_stages=False,
+                      dungeon_factory=functools.partial(dungeon_type, size=30, **kwargs))
+
+
+def _room_state(dungeon, coords):
+    room = dungeon.get_room(coords)
+    return [(enemy.template, enemy.hp) for enemy in room.enemies], sorted(room.items)
+
+
+def _play_with(engine):
+    dungeon = engine.dungeon
+    changed = sorted(dungeon.enemy_coords())[:5]
+    for coords in changed:
+        room = dungeon.get_room(coords)
+        room.remove_enemy(room.enemies[0])
+        room.add_item("Odd Gem")
+        room.add_item("Health Potion")
+    hurt = dungeon.get_room(sorted(dungeon.enemy_coords())[0])
+    hurt.enemies[0].hp -= 1
+    dungeon.mark_visited(hurt)
+    return changed + [hurt.coords]
+
+
+def _check_round_trip(engine, changed, path):
+    save_game(engine, path)
+    restored = load_game(path, output_func=None).dungeon
+    assert restored.enemy_count == engine.dungeon.enemy_count
+    assert sorted(restored.enemy_coords()) == sorted(engine.dungeon.enemy_coords())
+    for coords in changed:
+        assert _room_state(restored, coords) == _room_state(engine.dungeon, coords)
+    assert restored.get_room(changed[-1]).visited
+
+
+def test_object_dungeon_round_trip(tmp_path):
+    for generator in ("grid", "caves"):
+        engine = _engine(Dungeon, generator=generator)
+        _check_round_trip(engine, _play_with(engine), str(tmp_path / f"{generator}.snap"))
+
+
+def test_lazy_dungeon_saves_without_deriving_rooms(tmp_path):
+    engine = _engine(LazyDungeon, cache_size=64)
+    changed = _play_with(engine)
+    cached = list(engine.dungeon._rooms)
+    save_game(engine, str(tmp_path / "lazy.snap"))
+    assert list(engine.dungeon._rooms) == cached
+    _check_round_trip(engine, changed, str(tmp_path / "lazy.snap"))